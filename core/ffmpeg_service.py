@@ -1,10 +1,11 @@
 ﻿from __future__ import annotations
 
 from pathlib import Path
-from typing import Callable, Iterable, Mapping, Sequence
+from typing import Callable, Sequence
 
-from .ffmpeg_wrapper import FFmpegWrapper, InputSpec
-from .progress_monitor import ProgressUpdate
+from .ffmpeg_wrapper import FFmpegWrapper, InputSpec, OutputSpec, ParamsLike
+from .probe_cache import DEFAULT_CACHE_FILE
+from .progress_monitor import ProgressUpdate, SpawnCallback
 from .types import CommandResult
 
 ProgressCallback = Callable[[ProgressUpdate], None]
@@ -20,27 +21,62 @@ class FFmpegService:
         self,
         input_file: str | Path,
         output_file: str | Path,
-        params: Mapping[str, object] | None = None,
+        params: ParamsLike = None,
         *,
         duration: float | None = None,
         callback: ProgressCallback | None = None,
+        on_spawn: SpawnCallback | None = None,
     ) -> CommandResult:
+        params = self.wrapper.prepare_params(params)
         if callback:
-            return self.wrapper.run_with_progress(input_file, output_file, params, duration, callback)
-        return self.wrapper.run(input_file, output_file, params)
+            return self.wrapper.run_with_progress(
+                input_file, output_file, params, duration, callback, on_spawn=on_spawn
+            )
+        return self.wrapper.run(input_file, output_file, params, on_spawn=on_spawn)
+
+    def convert_multi(
+        self,
+        input_file: str | Path,
+        outputs: Sequence[OutputSpec],
+        params: ParamsLike = None,
+        *,
+        duration: float | None = None,
+        callback: ProgressCallback | None = None,
+        on_spawn: SpawnCallback | None = None,
+    ) -> CommandResult:
+        """Produce every ``(output_file, params)`` rendition from one decode of ``input_file``."""
+        if callback:
+            return self.wrapper.run_multi_with_progress(
+                input_file, outputs, params, duration, callback, on_spawn=on_spawn
+            )
+        return self.wrapper.run_multi(input_file, outputs, params, on_spawn=on_spawn)
 
     def merge(
         self,
         inputs: Sequence[InputSpec],
         output_file: str | Path,
-        params: Mapping[str, object] | None = None,
+        params: ParamsLike = None,
         *,
         total_duration: float | None = None,
         callback: ProgressCallback | None = None,
+        on_spawn: SpawnCallback | None = None,
     ) -> CommandResult:
+        params = self.wrapper.prepare_params(params, for_merge=True)
         if callback:
-            return self.wrapper.merge_with_progress(inputs, output_file, params, total_duration, callback)
-        return self.wrapper.merge_files(inputs, output_file, params)
+            return self.wrapper.merge_with_progress(
+                inputs, output_file, params, total_duration, callback, on_spawn=on_spawn
+            )
+        return self.wrapper.merge_files(inputs, output_file, params, on_spawn=on_spawn)
 
     def probe(self, media_path: str | Path) -> dict:
         return self.wrapper.probe(media_path)
+
+    def invalidate_probe(self, media_path: str | Path | None = None) -> None:
+        self.wrapper.invalidate_probe(media_path)
+
+    def load_probe_cache(self, cache_file: str | Path = DEFAULT_CACHE_FILE) -> None:
+        self.wrapper.probe_cache.load(cache_file)
+
+    def save_probe_cache(self, cache_file: str | Path = DEFAULT_CACHE_FILE) -> None:
+        self.wrapper.probe_cache.dump(cache_file)
+
@@ -1,87 +1,388 @@
 from __future__ import annotations
 
+import functools
 import json
+import os
 import shlex
+import string
 import subprocess
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, Iterable, List, Mapping, Sequence, Union
-
-from . import progress_monitor
-from .progress_monitor import ProgressUpdate
+from typing import Callable, Iterable, List, Mapping, Sequence, Tuple, Union
+
+from . import output_cache, progress_monitor
+from .hwaccel import AUTO_ORDER, HW_BACKENDS, VAAPI_UPLOAD_FILTER, HardwareEncoders, HwPlan, generic_codec
+from .probe_cache import ProbeCache
+from .progress_monitor import ProgressUpdate, SpawnCallback
+from .spawn import FAST_SPAWN_KWARGS, resolve_executable
+from .stream_tail import StreamTail
 from .types import CommandResult, FFmpegError
 
 
 InputSpec = Union[str, Path, Mapping[str, object]]
 
 
+@dataclass(frozen=True, slots=True)
+class PreparedParams:
+    """Params mapping already turned into argv fragments, reusable across commands.
+
+    Built by ``FFmpegWrapper.prepare_params``; every ``build_*`` method accepts it in
+    place of the raw mapping.
+    """
+
+    source: Mapping[str, object]
+    for_merge: bool
+    hw_decode: bool
+    global_args: tuple[str, ...]
+    start_args: tuple[str, ...]
+    input_args: tuple[str, ...]
+    end_args: tuple[str, ...]
+    video_args: tuple[str, ...]
+    audio_args: tuple[str, ...]
+    output_args: tuple[str, ...]
+
+
+ParamsLike = Union[Mapping[str, object], PreparedParams, None]
+# One rendition of a multi-output convert: target path and its own params.
+OutputSpec = Tuple[Union[str, Path], ParamsLike]
+
+
+class _FrozenParams(tuple):
+    """Hashable, order-independent snapshot of a params mapping (usable as a cache key).
+
+    Entries are ``(key, type, value)``: ``23`` == ``23.0`` and ``1`` == ``True`` but they
+    stringify differently, so they must not share a cache slot.
+    """
+
+    __slots__ = ()
+
+    def thaw(self) -> dict:
+        return {key: _thaw(value) for key, _, value in self}
+
+
+class _FrozenSeq(tuple):
+    """Sequence counterpart of ``_FrozenParams``; items are ``(type, value)`` pairs."""
+
+    __slots__ = ()
+
+    def thaw(self) -> tuple:
+        return tuple(_thaw(value) for _, value in self)
+
+
+# Characters shlex.quote leaves untouched.
+_SHELL_SAFE = frozenset(string.ascii_letters + string.digits + "@%+=:,./-_")
+
+
+@functools.lru_cache(maxsize=2048)
+def _quote(arg: str) -> str:
+    if arg and all(char in _SHELL_SAFE for char in arg):
+        return arg
+    return shlex.quote(arg)
+
+
+# Per-input branches of the concat graph; only the input index varies within one graph.
+_CONCAT_VIDEO_TMPL = (
+    "[%d:v]scale=%d:%d:force_original_aspect_ratio=decrease,pad=%d:%d:(ow-iw)/2:(oh-ih)/2,"
+    "setsar=1,setpts=PTS-STARTPTS[v%d]"
+)
+_CONCAT_AUDIO_TMPL = "[%d:a]aresample=async=1:first_pts=0[a%d]"
+# Formatted with the sample rate first, leaving the label index for each silent input.
+_CONCAT_SILENCE_TMPL = "anullsrc=channel_layout=stereo:sample_rate=%d,asetpts=PTS-STARTPTS[a%%d]"
+
+
+def _parse_resolution(value: object) -> tuple[str, str] | None:
+    width, sep, height = str(value).lower().partition("x")
+    if sep and width.isdigit() and height.isdigit():
+        return width, height
+    return None
+
+
+def _freeze(value: object) -> object:
+    if isinstance(value, Mapping):
+        return _FrozenParams((key, type(item), _freeze(item)) for key, item in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        return _FrozenSeq((type(item), _freeze(item)) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+def _thaw(value: object) -> object:
+    return value.thaw() if isinstance(value, (_FrozenParams, _FrozenSeq)) else value
+
+
+# Queued jobs overwhelmingly share the same settings, so the argv fragments are
+# memoized on a frozen view of the params mapping. These live at module level so the
+# caches never keep an ``FFmpegWrapper`` alive.
+@functools.lru_cache(maxsize=128, typed=True)
+def _video_args(
+    frozen: _FrozenParams,
+    allow_filters: bool,
+    hw_decode: bool,
+    hw_encoders: HardwareEncoders,
+) -> tuple[str, ...]:
+    video = frozen.thaw()
+    plan = _hw_plan(frozen, hw_decode, hw_encoders)
+    backend = plan.backend if plan is not None else None
+    args: List[str] = []
+    codec = plan.encoder if plan is not None else video.get("codec")
+    if codec:
+        args.extend(["-c:v", str(codec)])
+
+    crf = video.get("crf")
+    bitrate = video.get("bitrate")
+    if crf is not None and backend is None:
+        args.extend(["-crf", str(crf)])
+    elif crf is not None and backend.quality is not None:
+        args.extend(backend.quality(crf))
+    elif bitrate:
+        args.extend(["-b:v", str(bitrate)])
+
+    if (fps := video.get("fps")) is not None:
+        args.extend(["-r", str(fps)])
+    scale = ""
+    if (resolution := video.get("resolution")):
+        size = _parse_resolution(resolution)
+        if plan is not None and plan.gpu_frames:
+            scale = str(backend.scale_filter).format(w=size[0], h=size[1])
+        elif plan is not None and plan.upload and allow_filters and size:
+            # -s would scale after hwupload, on frames the software scaler cannot read.
+            scale = "scale=%s:%s" % size
+        else:
+            args.extend(["-s", str(resolution)])
+    if (preset := video.get("preset")):
+        # Hardware encoders only share a few preset names with x264 and ignore -tune.
+        if backend is None or preset in backend.presets:
+            args.extend(["-preset", str(preset)])
+    if (tune := video.get("tune")) and backend is None:
+        args.extend(["-tune", str(tune)])
+
+    if allow_filters:
+        filters = [_build_video_filters(video), scale]
+        if plan is not None and plan.upload:
+            filters.append(VAAPI_UPLOAD_FILTER)
+        if filters := ",".join(item for item in filters if item):
+            args.extend(["-vf", filters])
+    return tuple(args)
+
+
+@functools.lru_cache(maxsize=128, typed=True)
+def _hw_plan(frozen: _FrozenParams, hw_decode: bool, hw_encoders: HardwareEncoders) -> HwPlan | None:
+    """Pick a working hardware encoder for ``video["hwaccel"]``, or ``None`` for software.
+
+    ``"auto"`` tries ``AUTO_ORDER``; a named backend that is not usable on this
+    machine falls back to the software encoder rather than failing the job. Only an
+    explicitly named backend keeps decoded frames on the GPU: with ``"auto"`` the
+    input may be a format the GPU cannot decode, and FFmpeg's silent fallback to
+    software frames would break the GPU scale filter.
+    """
+    video = frozen.thaw()
+    choice = str(video.get("hwaccel") or "none").lower()
+    generic = generic_codec(video.get("codec"))
+    if choice == "none" or generic is None:
+        return None
+
+    cpu_filters = bool(_build_video_filters(video))
+    resolution = video.get("resolution")
+    for name in AUTO_ORDER if choice == "auto" else (choice,):
+        backend = HW_BACKENDS.get(name)
+        encoder = backend.encoders.get(generic) if backend is not None else None
+        if encoder is None:
+            continue
+        # Uploading needs a device declared in the global options, which merges and
+        # multi-output renditions do not get.
+        if backend.needs_upload and not hw_decode:
+            continue
+        if not hw_encoders.is_available(backend, encoder, video.get("crf") is not None):
+            continue
+        gpu_frames = (
+            hw_decode
+            and choice != "auto"
+            and backend.output_format is not None
+            and not cpu_filters
+            and (not resolution or (backend.scale_filter is not None and _parse_resolution(resolution)))
+        )
+        return HwPlan(
+            backend=backend,
+            encoder=encoder,
+            decode=hw_decode,
+            gpu_frames=bool(gpu_frames),
+            upload=backend.needs_upload and not gpu_frames,
+        )
+    return None
+
+
+@functools.lru_cache(maxsize=128, typed=True)
+def _audio_args(frozen: _FrozenParams) -> tuple[str, ...]:
+    audio = frozen.thaw()
+    args: List[str] = []
+    codec = audio.get("codec")
+    if codec:
+        args.extend(["-c:a", str(codec)])
+    if (bitrate := audio.get("bitrate")):
+        args.extend(["-b:a", str(bitrate)])
+    if (sample_rate := audio.get("sample_rate")):
+        args.extend(["-ar", str(sample_rate)])
+    if (channels := audio.get("channels")):
+        args.extend(["-ac", str(channels)])
+    if afilters := _build_audio_filters(audio):
+        args.extend(["-af", afilters])
+    return tuple(args)
+
+
+def _build_video_filters(video: Mapping[str, object]) -> str:
+    filters: list[str] = []
+    crop = video.get("crop") or {}
+    if crop:
+        w = crop.get("w")
+        h = crop.get("h")
+        if w and h:
+            x = crop.get("x", 0)
+            y = crop.get("y", 0)
+            filters.append(f"crop={w}:{h}:{x}:{y}")
+
+    rotate = video.get("rotate")
+    if rotate in {90, 180, 270}:
+        mapping = {90: "transpose=1", 180: "transpose=2,transpose=2", 270: "transpose=2"}
+        filters.append(mapping[int(rotate)])
+    elif rotate and rotate % 360 != 0:
+        # non right-angle rotation uses radians in FFmpeg
+        filters.append(f"rotate={float(rotate)}*PI/180")
+
+    color = video.get("color") or {}
+    if color:
+        brightness = float(color.get("brightness", 0)) / 100
+        contrast = float(color.get("contrast", 0)) / 100 + 1
+        saturation = float(color.get("saturation", 0)) / 100 + 1
+        filters.append(f"eq=brightness={brightness}:contrast={contrast}:saturation={saturation}")
+
+    return ",".join(filters)
+
+
+def _build_audio_filters(audio: Mapping[str, object]) -> str:
+    filters: list[str] = []
+    if audio.get("loudnorm"):
+        target = audio["loudnorm"].get("target", -16)
+        true_peak = audio["loudnorm"].get("true_peak", -1)
+        filters.append(f"loudnorm=I={target}:TP={true_peak}:LRA=11")
+    if audio.get("denoise"):
+        strength = audio["denoise"].get("strength", 12)
+        filters.append(f"afftdn=nr={strength}")
+    return ",".join(filters)
+
+
 class FFmpegWrapper:
     """Utility facade for building and executing basic FFmpeg commands."""
 
-    def __init__(self, ffmpeg_path: str = "ffmpeg", ffprobe_path: str = "ffprobe") -> None:
-        self.ffmpeg_path = ffmpeg_path
-        self.ffprobe_path = ffprobe_path
+    def __init__(
+        self,
+        ffmpeg_path: str = "ffmpeg",
+        ffprobe_path: str = "ffprobe",
+        *,
+        probe_cache: ProbeCache | None = None,
+    ) -> None:
+        # Absolute paths skip the PATH search on every launch and keep posix_spawn usable.
+        self.ffmpeg_path = resolve_executable(ffmpeg_path)
+        self.ffprobe_path = resolve_executable(ffprobe_path)
+        self.probe_cache = probe_cache if probe_cache is not None else ProbeCache()
+        self.hw_encoders = HardwareEncoders(self.ffmpeg_path)
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
+    def prepare_params(
+        self,
+        params: ParamsLike = None,
+        *,
+        for_merge: bool = False,
+        hw_decode: bool = True,
+    ) -> PreparedParams:
+        """Stringify ``params`` once into the argv fragments ``build_*`` splices in.
+
+        With ``video["hwaccel"]`` set, ``hw_decode=False`` limits the hardware path to
+        swapping the encoder (merges always behave this way).
+        """
+        hw_decode = hw_decode and not for_merge
+        if isinstance(params, PreparedParams):
+            if params.for_merge == for_merge and params.hw_decode == hw_decode:
+                return params
+            params = params.source
+        params = dict(params or {})
+        frozen_video = _freeze(params.get("video") or {})
+        hw_plan = _hw_plan(frozen_video, hw_decode, self.hw_encoders)
+
+        threads = params.get("threads")
+        thread_args: tuple[str, ...] = ("-threads", str(threads)) if threads is not None else ()
+        global_args = ["-y" if params.get("overwrite", True) else "-n"]
+        if threads is not None:
+            global_args.extend(["-filter_complex_threads" if for_merge else "-filter_threads", str(threads)])
+        if hw_plan is not None:
+            global_args.extend(hw_plan.global_args())
+
+        start = params.get("start")
+        end = params.get("end")
+        extra = params.get("extra_args")
+        extra_args = tuple(str(arg) for arg in extra) if isinstance(extra, (list, tuple)) else ()
+
+        return PreparedParams(
+            source=params,
+            for_merge=for_merge,
+            hw_decode=hw_decode,
+            global_args=tuple(global_args),
+            start_args=("-ss", str(start)) if start is not None else (),
+            input_args=(hw_plan.input_args() if hw_plan is not None else ()) + thread_args,
+            end_args=("-to", str(end)) if end is not None else (),
+            video_args=_video_args(frozen_video, not for_merge, hw_decode, self.hw_encoders),
+            audio_args=_audio_args(_freeze(params.get("audio") or {})),
+            output_args=thread_args + extra_args,
+        )
+
     def build_command(
         self,
         input_file: str | Path,
         output_file: str | Path,
-        params: Mapping[str, object] | None = None,
+        params: ParamsLike = None,
     ) -> List[str]:
-        params = dict(params or {})
-        cmd: List[str] = [self.ffmpeg_path, "-hide_banner"]
-        overwrite = params.get("overwrite", True)
-        cmd.append("-y" if overwrite else "-n")
-
-        # Input timing controls
-        if (start := params.get("start")) is not None:
-            cmd.extend(["-ss", str(start)])
-
-        cmd.extend(["-i", str(input_file)])
-
-        if (end := params.get("end")) is not None:
-            cmd.extend(["-to", str(end)])
-
-        video_params = params.get("video") or {}
-        audio_params = params.get("audio") or {}
-
-        self._apply_video_params(cmd, video_params)
-        self._apply_audio_params(cmd, audio_params)
-
-        extra = params.get("extra_args")
-        if isinstance(extra, (list, tuple)):
-            cmd.extend(str(arg) for arg in extra)
-
-        cmd.append(str(output_file))
-        return cmd
+        prepared = self.prepare_params(params)
+        return [
+            self.ffmpeg_path,
+            "-hide_banner",
+            *prepared.global_args,
+            *prepared.start_args,
+            *prepared.input_args,
+            "-i",
+            os.fspath(input_file),
+            *prepared.end_args,
+            *prepared.video_args,
+            *prepared.audio_args,
+            *prepared.output_args,
+            os.fspath(output_file),
+        ]
 
     def build_merge_command(
         self,
         inputs: Sequence[InputSpec],
         output_file: str | Path,
-        params: Mapping[str, object] | None = None,
+        params: ParamsLike = None,
     ) -> List[str]:
         if len(inputs) < 2:
             raise ValueError("Merging requires at least two input files.")
 
-        params = dict(params or {})
+        prepared = self.prepare_params(params, for_merge=True)
         specs = [self._normalize_input_spec(item) for item in inputs]
+        self._fill_media_info(specs)
 
-        cmd: List[str] = [self.ffmpeg_path, "-hide_banner"]
-        overwrite = params.get("overwrite", True)
-        cmd.append("-y" if overwrite else "-n")
-
+        cmd: List[str] = [self.ffmpeg_path, "-hide_banner", *prepared.global_args]
         for spec in specs:
             if spec.get("start") is not None:
                 cmd.extend(["-ss", str(spec["start"])])
+            cmd.extend(prepared.input_args)
             cmd.extend(["-i", spec["path"]])
             if spec.get("end") is not None:
                 cmd.extend(["-to", str(spec["end"])])
 
-        video_params = params.get("video") or {}
-        audio_params = params.get("audio") or {}
+        video_params = prepared.source.get("video") or {}
+        audio_params = prepared.source.get("audio") or {}
         target_width, target_height = self._resolve_target_resolution(specs, video_params)
         audio_enabled = any(spec.get("has_audio", True) for spec in specs)
         audio_rate = int(audio_params.get("sample_rate") or 48000)
@@ -97,76 +398,165 @@ class FFmpegWrapper:
         if audio_label:
             cmd.extend(["-map", audio_label])
 
-        self._apply_video_params(cmd, video_params, allow_filters=False)
-        self._apply_audio_params(cmd, audio_params)
-
-        extra = params.get("extra_args")
-        if isinstance(extra, (list, tuple)):
-            cmd.extend(str(arg) for arg in extra)
+        cmd.extend(prepared.video_args)
+        cmd.extend(prepared.audio_args)
+        cmd.extend(prepared.output_args)
+        cmd.append(os.fspath(output_file))
+        return cmd
 
-        cmd.append(str(output_file))
+    def build_multi_output_command(
+        self,
+        input_file: str | Path,
+        outputs: Sequence[OutputSpec],
+        params: ParamsLike = None,
+    ) -> List[str]:
+        """Encode several renditions of ``input_file`` from a single decode.
+
+        ``params`` supplies the input-side options (overwrite, start, threads); each
+        output's own params supply its codecs, filters, ``end`` and extra args. The
+        shared ``threads``/``extra_args`` are repeated ahead of every output's own, which
+        win where both set the same option (FFmpeg keeps the last occurrence). Every
+        output keeps FFmpeg's default stream selection and its own ``-vf`` chain, so the
+        shared decode stays on the CPU and ``hwaccel`` only swaps each output's encoder.
+        """
+        if not outputs:
+            raise ValueError("At least one output is required.")
+
+        shared = self.prepare_params(params, hw_decode=False)
+        cmd: List[str] = [
+            self.ffmpeg_path,
+            "-hide_banner",
+            *shared.global_args,
+            *shared.start_args,
+            *shared.input_args,
+            "-i",
+            os.fspath(input_file),
+        ]
+        for output_file, output_params in outputs:
+            prepared = self.prepare_params(output_params, hw_decode=False)
+            cmd.extend(prepared.end_args)
+            cmd.extend(prepared.video_args)
+            cmd.extend(prepared.audio_args)
+            cmd.extend(shared.output_args)
+            cmd.extend(prepared.output_args)
+            cmd.append(os.fspath(output_file))
         return cmd
 
     def run(
         self,
         input_file: str | Path,
         output_file: str | Path,
-        params: Mapping[str, object] | None = None,
+        params: ParamsLike = None,
         *,
         check: bool = True,
+        on_spawn: SpawnCallback | None = None,
     ) -> CommandResult:
         command = self.build_command(input_file, output_file, params)
-        return self._execute(command, check=check)
+        return self._execute_cached(command, [output_file], params, check=check, on_spawn=on_spawn)
 
     def run_with_progress(
         self,
         input_file: str | Path,
         output_file: str | Path,
-        params: Mapping[str, object] | None,
+        params: ParamsLike,
         total_duration: float | None,
         callback: Callable[[ProgressUpdate], None],
         *,
         check: bool = True,
+        on_spawn: SpawnCallback | None = None,
     ) -> CommandResult:
         command = self.build_command(input_file, output_file, params)
-        return progress_monitor.run_with_progress(
+        return self._execute_cached(
             command,
-            total_duration,
-            callback,
+            [output_file],
+            params,
             check=check,
+            on_spawn=on_spawn,
+            progress=(total_duration, callback),
         )
 
     def merge_files(
         self,
         inputs: Sequence[InputSpec],
         output_file: str | Path,
-        params: Mapping[str, object] | None = None,
+        params: ParamsLike = None,
         *,
         check: bool = True,
+        on_spawn: SpawnCallback | None = None,
     ) -> CommandResult:
         command = self.build_merge_command(inputs, output_file, params)
-        return self._execute(command, check=check)
+        return self._execute_cached(command, [output_file], params, check=check, on_spawn=on_spawn)
 
     def merge_with_progress(
         self,
         inputs: Sequence[InputSpec],
         output_file: str | Path,
-        params: Mapping[str, object] | None,
+        params: ParamsLike,
         total_duration: float | None,
         callback: Callable[[ProgressUpdate], None],
         *,
         check: bool = True,
+        on_spawn: SpawnCallback | None = None,
     ) -> CommandResult:
         command = self.build_merge_command(inputs, output_file, params)
-        return progress_monitor.run_with_progress(
+        return self._execute_cached(
             command,
-            total_duration,
-            callback,
+            [output_file],
+            params,
             check=check,
+            on_spawn=on_spawn,
+            progress=(total_duration, callback),
+        )
+
+    def run_multi(
+        self,
+        input_file: str | Path,
+        outputs: Sequence[OutputSpec],
+        params: ParamsLike = None,
+        *,
+        check: bool = True,
+        on_spawn: SpawnCallback | None = None,
+    ) -> CommandResult:
+        command = self.build_multi_output_command(input_file, outputs, params)
+        output_files = [output_file for output_file, _ in outputs]
+        return self._execute_cached(command, output_files, params, check=check, on_spawn=on_spawn)
+
+    def run_multi_with_progress(
+        self,
+        input_file: str | Path,
+        outputs: Sequence[OutputSpec],
+        params: ParamsLike,
+        total_duration: float | None,
+        callback: Callable[[ProgressUpdate], None],
+        *,
+        check: bool = True,
+        on_spawn: SpawnCallback | None = None,
+    ) -> CommandResult:
+        command = self.build_multi_output_command(input_file, outputs, params)
+        return self._execute_cached(
+            command,
+            [output_file for output_file, _ in outputs],
+            params,
+            check=check,
+            on_spawn=on_spawn,
+            progress=(total_duration, callback),
         )
 
     def probe(self, media_path: str | Path) -> dict:
-        """Return ffprobe JSON output for the provided media file."""
+        """Return ffprobe JSON output for the provided media file.
+
+        Results are cached per ``(path, mtime, size)``; treat the returned dict as read-only.
+        """
+        try:
+            signature = ProbeCache.signature(media_path)
+        except OSError:
+            # Not a local file (URL, device, ...) – always ask ffprobe.
+            signature = None
+        if signature is not None:
+            cached = self.probe_cache.get(media_path, signature)
+            if cached is not None:
+                return cached
+
         command = [
             self.ffprobe_path,
             "-v",
@@ -177,109 +567,36 @@ class FFmpegWrapper:
             "-show_streams",
             str(media_path),
         ]
+        # Bytes go straight to json.loads, which decodes UTF-8 in C while parsing.
         completed = subprocess.run(
             command,
             capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="ignore",
             check=False,
+            **FAST_SPAWN_KWARGS,
         )
         if completed.returncode != 0:
             raise FFmpegError(
                 f"ffprobe failed with code {completed.returncode}",
                 command,
-                completed.stdout,
-                completed.stderr,
+                completed.stdout.decode("utf-8", "ignore"),
+                completed.stderr.decode("utf-8", "ignore"),
             )
-        return json.loads(completed.stdout or "{}")
+        try:
+            info = json.loads(completed.stdout or b"{}")
+        except UnicodeDecodeError:
+            # Tags written in a legacy code page are not valid UTF-8.
+            info = json.loads(completed.stdout.decode("utf-8", "ignore"))
+        if signature is not None:
+            self.probe_cache.put(media_path, signature, info)
+        return info
+
+    def invalidate_probe(self, media_path: str | Path | None = None) -> None:
+        """Forget cached ffprobe output for ``media_path`` (or for every file)."""
+        self.probe_cache.invalidate(media_path)
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
-    def _apply_video_params(
-        self,
-        cmd: List[str],
-        video: Mapping[str, object],
-        *,
-        allow_filters: bool = True,
-    ) -> None:
-        codec = video.get("codec")
-        if codec:
-            cmd.extend(["-c:v", str(codec)])
-
-        crf = video.get("crf")
-        bitrate = video.get("bitrate")
-        if crf is not None:
-            cmd.extend(["-crf", str(crf)])
-        elif bitrate:
-            cmd.extend(["-b:v", str(bitrate)])
-
-        if (fps := video.get("fps")) is not None:
-            cmd.extend(["-r", str(fps)])
-        if (resolution := video.get("resolution")):
-            cmd.extend(["-s", str(resolution)])
-        if (preset := video.get("preset")):
-            cmd.extend(["-preset", str(preset)])
-        if (tune := video.get("tune")):
-            cmd.extend(["-tune", str(tune)])
-
-        if allow_filters:
-            if filters := self._build_video_filters(video):
-                cmd.extend(["-vf", filters])
-
-    def _apply_audio_params(self, cmd: List[str], audio: Mapping[str, object]) -> None:
-        codec = audio.get("codec")
-        if codec:
-            cmd.extend(["-c:a", str(codec)])
-        if (bitrate := audio.get("bitrate")):
-            cmd.extend(["-b:a", str(bitrate)])
-        if (sample_rate := audio.get("sample_rate")):
-            cmd.extend(["-ar", str(sample_rate)])
-        if (channels := audio.get("channels")):
-            cmd.extend(["-ac", str(channels)])
-        if afilters := self._build_audio_filters(audio):
-            cmd.extend(["-af", afilters])
-
-    def _build_video_filters(self, video: Mapping[str, object]) -> str:
-        filters: list[str] = []
-        crop = video.get("crop") or {}
-        if crop:
-            w = crop.get("w")
-            h = crop.get("h")
-            if w and h:
-                x = crop.get("x", 0)
-                y = crop.get("y", 0)
-                filters.append(f"crop={w}:{h}:{x}:{y}")
-
-        rotate = video.get("rotate")
-        if rotate in {90, 180, 270}:
-            mapping = {90: "transpose=1", 180: "transpose=2,transpose=2", 270: "transpose=2"}
-            filters.append(mapping[int(rotate)])
-        elif rotate and rotate % 360 != 0:
-            # non right-angle rotation uses radians in FFmpeg
-            filters.append(f"rotate={float(rotate)}*PI/180")
-
-        color = video.get("color") or {}
-        if color:
-            brightness = float(color.get("brightness", 0)) / 100
-            contrast = float(color.get("contrast", 0)) / 100 + 1
-            saturation = float(color.get("saturation", 0)) / 100 + 1
-            filters.append(f"eq=brightness={brightness}:contrast={contrast}:saturation={saturation}")
-
-        return ",".join(filters)
-
-    def _build_audio_filters(self, audio: Mapping[str, object]) -> str:
-        filters: list[str] = []
-        if audio.get("loudnorm"):
-            target = audio["loudnorm"].get("target", -16)
-            true_peak = audio["loudnorm"].get("true_peak", -1)
-            filters.append(f"loudnorm=I={target}:TP={true_peak}:LRA=11")
-        if audio.get("denoise"):
-            strength = audio["denoise"].get("strength", 12)
-            filters.append(f"afftdn=nr={strength}")
-        return ",".join(filters)
-
     def _resolve_target_resolution(
         self,
         specs: Sequence[Mapping[str, object]],
@@ -297,6 +614,31 @@ class FFmpegWrapper:
                 return int(spec["width"]), int(spec["height"])
         return 1920, 1080
 
+    def _fill_media_info(self, specs: Sequence[dict]) -> None:
+        """Probe inputs whose size or audio presence the caller did not provide.
+
+        Without real dimensions the merge falls back to 1920x1080 and scales every
+        clip; without real audio info a silent clip breaks the ``[n:a]`` graph input.
+        """
+        for spec in specs:
+            needs_size = not (spec.get("width") and spec.get("height"))
+            needs_audio = "has_audio" not in spec
+            if not (needs_size or needs_audio):
+                continue
+            try:
+                info = self.probe(spec["path"])
+            except (FFmpegError, OSError, ValueError):
+                continue
+            streams = info.get("streams", [])
+            if needs_size:
+                for stream in streams:
+                    if stream.get("codec_type") == "video" and stream.get("width") and stream.get("height"):
+                        spec["width"] = int(stream["width"])
+                        spec["height"] = int(stream["height"])
+                        break
+            if needs_audio:
+                spec["has_audio"] = any(stream.get("codec_type") == "audio" for stream in streams)
+
     def _build_concat_filter(
         self,
         specs: Sequence[Mapping[str, object]],
@@ -305,34 +647,35 @@ class FFmpegWrapper:
         audio_enabled: bool,
         audio_rate: int,
     ) -> tuple[str, str, str | None]:
-        parts: list[str] = []
-        video_labels: list[str] = []
-        audio_labels: list[str] = []
-
-        for idx, spec in enumerate(specs):
-            v_label = f"[v{idx}]"
-            video_labels.append(v_label)
-            parts.append(
-                f"[{idx}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
-                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,setpts=PTS-STARTPTS{v_label}"
-            )
-            if audio_enabled:
-                a_label = f"[a{idx}]"
-                audio_labels.append(a_label)
-                if spec.get("has_audio", True):
-                    parts.append(f"[{idx}:a]aresample=async=1:first_pts=0{a_label}")
-                else:
-                    parts.append(
-                        f"anullsrc=channel_layout=stereo:sample_rate={audio_rate},asetpts=PTS-STARTPTS{a_label}"
-                    )
-
-        concat_inputs = "".join(video_labels + (audio_labels if audio_enabled else []))
-        concat_line = (
-            f"{concat_inputs}concat=n={len(specs)}:v=1:a={1 if audio_enabled else 0}[vout]"
-            + ("[aout]" if audio_enabled else "")
-        )
-        parts.append(concat_line)
-        return ";".join(parts), "[vout]", "[aout]" if audio_enabled else None
+        audio_mask = tuple(bool(spec.get("has_audio", True)) for spec in specs)
+        return self._concat_filter_graph(width, height, audio_enabled, audio_rate, audio_mask)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _concat_filter_graph(
+        width: int,
+        height: int,
+        audio_enabled: bool,
+        audio_rate: int,
+        audio_mask: tuple[bool, ...],
+    ) -> tuple[str, str, str | None]:
+        # The graph only depends on the shape of the inputs, not on their paths.
+        count = len(audio_mask)
+        video_parts = [_CONCAT_VIDEO_TMPL % (idx, width, height, width, height, idx) for idx in range(count)]
+        if audio_enabled:
+            silence = _CONCAT_SILENCE_TMPL % audio_rate
+            audio_parts = [
+                _CONCAT_AUDIO_TMPL % (idx, idx) if has_audio else silence % idx
+                for idx, has_audio in enumerate(audio_mask)
+            ]
+            parts = [part for pair in zip(video_parts, audio_parts) for part in pair]
+            labels = "".join(["[v%d]" % idx for idx in range(count)] + ["[a%d]" % idx for idx in range(count)])
+            parts.append("%sconcat=n=%d:v=1:a=1[vout][aout]" % (labels, count))
+            return ";".join(parts), "[vout]", "[aout]"
+
+        labels = "".join(["[v%d]" % idx for idx in range(count)])
+        video_parts.append("%sconcat=n=%d:v=1:a=0[vout]" % (labels, count))
+        return ";".join(video_parts), "[vout]", None
 
     def _normalize_input_spec(self, item: InputSpec) -> dict:
         if isinstance(item, (str, Path)):
@@ -354,28 +697,82 @@ class FFmpegWrapper:
             return normalized
         raise TypeError(f"Unsupported input type: {type(item)!r}")
 
-    def _execute(self, command: List[str], *, check: bool) -> CommandResult:
-        completed = subprocess.run(
+    def _execute_cached(
+        self,
+        command: List[str],
+        output_files: Sequence[str | Path],
+        params: ParamsLike,
+        *,
+        check: bool,
+        on_spawn: SpawnCallback | None = None,
+        progress: tuple[float | None, Callable[[ProgressUpdate], None]] | None = None,
+    ) -> CommandResult:
+        """Run ``command`` unless every output is newer than its inputs and was built by it.
+
+        Freshness is an mtime comparison plus the command digest stored in each output's
+        ``.ffcache`` sidecar; ``params["force"]`` always re-encodes.
+        """
+        source = params.source if isinstance(params, PreparedParams) else (params or {})
+        digest = output_cache.command_digest(command)
+        if not source.get("force"):
+            inputs = [command[idx + 1] for idx, arg in enumerate(command[:-1]) if arg == "-i"]
+            if all(output_cache.is_fresh(inputs, output_file, digest) for output_file in output_files):
+                if progress is not None:
+                    total_duration, callback = progress
+                    callback(ProgressUpdate(1.0, total_duration, None, None, 0, "Output is up to date", True, 0))
+                return CommandResult(returncode=0, stdout="", stderr="", command=command)
+
+        for output_file in output_files:
+            output_cache.forget(output_file)
+        if progress is None:
+            result = self._execute(command, check=check, on_spawn=on_spawn)
+        else:
+            total_duration, callback = progress
+            result = progress_monitor.run_with_progress(
+                progress_monitor.with_progress_args(command),
+                total_duration,
+                callback,
+                check=check,
+                on_spawn=on_spawn,
+            )
+        if result.returncode == 0:
+            for output_file in output_files:
+                output_cache.record(output_file, digest)
+        return result
+
+    def _execute(
+        self,
+        command: List[str],
+        *,
+        check: bool,
+        on_spawn: SpawnCallback | None = None,
+    ) -> CommandResult:
+        process = subprocess.Popen(
             command,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="ignore",
-            check=False,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            **FAST_SPAWN_KWARGS,
         )
+        # Only the tail of FFmpeg's log is kept; long encodes emit megabytes of it.
+        stderr_tail = StreamTail(process.stderr)
+        if on_spawn:
+            on_spawn(process)
+        returncode = process.wait()
+        stderr = stderr_tail.text()
         result = CommandResult(
-            returncode=completed.returncode,
-            stdout=completed.stdout,
-            stderr=completed.stderr,
+            returncode=returncode,
+            stdout="",
+            stderr=stderr,
             command=command,
         )
 
-        if check and completed.returncode != 0:
+        if check and returncode != 0:
             raise FFmpegError(
-                f"FFmpeg exited with code {completed.returncode}",
+                f"FFmpeg exited with code {returncode}",
                 command,
-                completed.stdout,
-                completed.stderr,
+                "",
+                stderr,
             )
         return result
 
@@ -385,4 +782,4 @@ class FFmpegWrapper:
     @staticmethod
     def stringify(command: Iterable[str]) -> str:
         """Return a shell-safe string for logging or debugging."""
-        return " ".join(shlex.quote(str(part)) for part in command)
+        return " ".join(_quote(str(part)) for part in command)
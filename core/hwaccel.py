@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import subprocess
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Dict, FrozenSet, Mapping, Tuple
+
+from .spawn import FAST_SPAWN_KWARGS
+
+# Turns an x264 CRF value into the encoder's own constant-quality options.
+QualityArgs = Callable[[object], Tuple[str, ...]]
+
+# CRF used when checking that an encoder accepts its constant-quality options.
+_PROBE_CRF = 23
+
+
+def _crf_as(flag: str) -> QualityArgs:
+    """``flag`` shares x264's 0-51, lower-is-better scale, so CRF passes through."""
+    return lambda crf: (flag, str(crf))
+
+
+def _videotoolbox_quality(crf: object) -> Tuple[str, ...]:
+    # -q:v runs 1-100 and higher is better; map CRF 0-51 linearly onto 100-1.
+    value = round(100 - float(crf) * 99 / 51)
+    return ("-q:v", str(min(100, max(1, value))))
+
+
+def _amf_quality(crf: object) -> Tuple[str, ...]:
+    qp = str(round(float(crf)))
+    return ("-rc", "cqp", "-qp_i", qp, "-qp_p", qp)
+
+
+@dataclass(frozen=True, slots=True)
+class HwBackend:
+    """How one GPU vendor API maps onto FFmpeg options."""
+
+    name: str
+    hwaccel: str
+    encoders: Mapping[str, str]
+    # Frame format that keeps decoded frames in GPU memory, if the encoder takes it.
+    output_format: str | None = None
+    # Scale filter usable on GPU frames, formatted with ``w``/``h``.
+    scale_filter: str | None = None
+    # Constant-quality options standing in for x264's -crf.
+    quality: QualityArgs | None = None
+    presets: FrozenSet[str] = frozenset()
+    # Encoder only accepts hardware frames, so CPU frames have to be uploaded first.
+    needs_upload: bool = False
+
+
+HW_BACKENDS: Dict[str, HwBackend] = {
+    "nvenc": HwBackend(
+        "nvenc",
+        "cuda",
+        {"h264": "h264_nvenc", "hevc": "hevc_nvenc"},
+        output_format="cuda",
+        scale_filter="scale_cuda={w}:{h}",
+        quality=_crf_as("-cq"),
+        presets=frozenset({"slow", "medium", "fast"}),
+    ),
+    "qsv": HwBackend(
+        "qsv",
+        "qsv",
+        {"h264": "h264_qsv", "hevc": "hevc_qsv", "vp9": "vp9_qsv"},
+        output_format="qsv",
+        scale_filter="scale_qsv=w={w}:h={h}",
+        quality=_crf_as("-global_quality"),
+        presets=frozenset({"veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"}),
+    ),
+    "vaapi": HwBackend(
+        "vaapi",
+        "vaapi",
+        {"h264": "h264_vaapi", "hevc": "hevc_vaapi", "vp9": "vp9_vaapi"},
+        output_format="vaapi",
+        scale_filter="scale_vaapi=w={w}:h={h}",
+        quality=_crf_as("-qp"),
+        needs_upload=True,
+    ),
+    "videotoolbox": HwBackend(
+        "videotoolbox",
+        "videotoolbox",
+        {"h264": "h264_videotoolbox", "hevc": "hevc_videotoolbox"},
+        quality=_videotoolbox_quality,
+    ),
+    "amf": HwBackend(
+        "amf",
+        "d3d11va",
+        {"h264": "h264_amf", "hevc": "hevc_amf"},
+        quality=_amf_quality,
+    ),
+}
+
+# Preference order for ``hwaccel="auto"``.
+AUTO_ORDER: Tuple[str, ...] = ("nvenc", "qsv", "vaapi", "videotoolbox", "amf")
+
+_CODEC_ALIASES = {
+    "h264": "h264",
+    "libx264": "h264",
+    "avc": "h264",
+    "hevc": "hevc",
+    "h265": "hevc",
+    "libx265": "hevc",
+    "vp9": "vp9",
+    "libvpx-vp9": "vp9",
+}
+
+# Named device used when CPU frames must be uploaded to VAAPI.
+VAAPI_DEVICE_ARGS = ("-init_hw_device", "vaapi=va", "-filter_hw_device", "va")
+VAAPI_UPLOAD_FILTER = "format=nv12,hwupload"
+
+
+def generic_codec(codec: object) -> str | None:
+    """Map an encoder/codec name to the generic key used in ``HwBackend.encoders``."""
+    return _CODEC_ALIASES.get(str(codec).lower()) if codec else None
+
+
+class HardwareEncoders:
+    """Lazily discovers which hardware encoders actually work with ``ffmpeg_path``.
+
+    Being compiled into FFmpeg (``-encoders``) is not enough - the GPU and driver must
+    be present too - so every candidate is confirmed once with a one-frame test encode.
+    With ``quality`` the test also passes the backend's constant-quality options, which
+    some hardware (e.g. VideoToolbox on Intel Macs) rejects.
+    """
+
+    def __init__(self, ffmpeg_path: str) -> None:
+        self.ffmpeg_path = ffmpeg_path
+        self._listed: FrozenSet[str] | None = None
+        self._working: Dict[Tuple[str, bool], bool] = {}
+        self._lock = Lock()
+
+    def is_available(self, backend: HwBackend, encoder: str, quality: bool = False) -> bool:
+        key = (encoder, quality)
+        with self._lock:
+            if key not in self._working:
+                self._working[key] = encoder in self._list_encoders() and self._test_encode(backend, encoder, quality)
+            return self._working[key]
+
+    def _list_encoders(self) -> FrozenSet[str]:
+        if self._listed is None:
+            try:
+                completed = subprocess.run(
+                    [self.ffmpeg_path, "-hide_banner", "-encoders"],
+                    capture_output=True,
+                    check=False,
+                    timeout=15,
+                    **FAST_SPAWN_KWARGS,
+                )
+                lines = completed.stdout.decode("utf-8", "ignore").splitlines()
+            except (OSError, subprocess.SubprocessError):
+                lines = []
+            names = set()
+            for line in lines:
+                parts = line.split()
+                # Capability flags look like "V....D"; the encoder name follows.
+                if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+                    names.add(parts[1])
+            self._listed = frozenset(names)
+        return self._listed
+
+    def _test_encode(self, backend: HwBackend, encoder: str, quality: bool) -> bool:
+        command = [self.ffmpeg_path, "-hide_banner", "-v", "error"]
+        if backend.needs_upload:
+            command.extend(VAAPI_DEVICE_ARGS)
+        command.extend(["-f", "lavfi", "-i", "color=black:s=256x256:d=0.1", "-frames:v", "1"])
+        if backend.needs_upload:
+            command.extend(["-vf", VAAPI_UPLOAD_FILTER])
+        command.extend(["-c:v", encoder])
+        if quality and backend.quality is not None:
+            command.extend(backend.quality(_PROBE_CRF))
+        command.extend(["-f", "null", "-"])
+        try:
+            completed = subprocess.run(
+                command,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=False,
+                timeout=15,
+                **FAST_SPAWN_KWARGS,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return completed.returncode == 0
+
+
+@dataclass(frozen=True, slots=True)
+class HwPlan:
+    """Hardware encoder chosen for one set of video params."""
+
+    backend: HwBackend
+    encoder: str
+    # Decode with ``-hwaccel`` (False when only the encoder is swapped, e.g. merges).
+    decode: bool
+    # Decoded frames stay in GPU memory; scaling must then use ``backend.scale_filter``.
+    gpu_frames: bool
+    # CPU frames are uploaded with ``VAAPI_UPLOAD_FILTER`` before encoding.
+    upload: bool
+
+    def global_args(self) -> tuple[str, ...]:
+        return VAAPI_DEVICE_ARGS if self.upload else ()
+
+    def input_args(self) -> tuple[str, ...]:
+        if not self.decode:
+            return ()
+        args = ("-hwaccel", self.backend.hwaccel)
+        if self.gpu_frames:
+            return args + ("-hwaccel_output_format", str(self.backend.output_format))
+        if self.upload:
+            return args + ("-hwaccel_device", "va")
+        return args
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterable, Sequence
+
+# Written next to each output after a successful encode; holds the command digest.
+SIDECAR_SUFFIX = ".ffcache"
+
+
+def command_digest(command: Sequence[str]) -> str:
+    """Stable fingerprint of an FFmpeg argv (inputs, codecs, filters, outputs)."""
+    return hashlib.blake2b("\0".join(command).encode("utf-8", "surrogateescape"), digest_size=16).hexdigest()
+
+
+def sidecar_path(output_file: str | Path) -> str:
+    return os.fspath(output_file) + SIDECAR_SUFFIX
+
+
+def is_fresh(inputs: Iterable[str | Path], output_file: str | Path, digest: str) -> bool:
+    """True when ``output_file`` is newer than every input and was built by ``digest``."""
+    try:
+        output_mtime = os.stat(output_file).st_mtime_ns
+        if any(os.stat(path).st_mtime_ns >= output_mtime for path in inputs):
+            return False
+        with open(sidecar_path(output_file), encoding="ascii") as handle:
+            return handle.read().strip() == digest
+    except (OSError, ValueError):
+        return False
+
+
+def forget(output_file: str | Path) -> None:
+    """Drop the sidecar before re-encoding so a failed run never looks up to date."""
+    try:
+        os.unlink(sidecar_path(output_file))
+    except OSError:
+        pass
+
+
+def record(output_file: str | Path, digest: str) -> None:
+    try:
+        with open(sidecar_path(output_file), "w", encoding="ascii") as handle:
+            handle.write(digest)
+    except OSError:
+        # The cache is an optimisation; an unwritable directory only costs a re-encode.
+        pass
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from threading import RLock
+from typing import Tuple
+
+# (st_mtime_ns, st_size) of the file at the time it was probed.
+StatSignature = Tuple[int, int]
+
+DEFAULT_CACHE_FILE = Path.home() / ".cache" / "video_change" / "probe.json"
+
+
+class ProbeCache:
+    """Thread-safe LRU of parsed ffprobe output, invalidated by file mtime/size."""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[StatSignature, dict]] = OrderedDict()
+        self._lock = RLock()
+
+    @staticmethod
+    def signature(media_path: str | Path) -> StatSignature:
+        st = os.stat(media_path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, media_path: str | Path, signature: StatSignature) -> dict | None:
+        key = os.fspath(media_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != signature:
+                # File changed on disk since it was probed.
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, media_path: str | Path, signature: StatSignature, info: dict) -> None:
+        key = os.fspath(media_path)
+        with self._lock:
+            self._entries[key] = (signature, info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, media_path: str | Path | None = None) -> None:
+        """Drop the entry for ``media_path``, or every entry when no path is given."""
+        with self._lock:
+            if media_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.fspath(media_path), None)
+
+    def load(self, cache_file: str | Path = DEFAULT_CACHE_FILE) -> None:
+        """Merge entries persisted by ``dump``; a missing or corrupt file is ignored."""
+        try:
+            with open(cache_file, encoding="utf-8") as handle:
+                entries = json.load(handle)
+        except (OSError, ValueError):
+            return
+        if not isinstance(entries, list):
+            return
+        with self._lock:
+            for entry in entries:
+                try:
+                    key, mtime_ns, size, info = entry
+                    signature = (int(mtime_ns), int(size))
+                except (TypeError, ValueError):
+                    continue
+                if isinstance(key, str) and isinstance(info, dict) and key not in self._entries:
+                    # Entries are stored oldest first, so recency survives the round trip.
+                    self._entries[key] = (signature, info)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def dump(self, cache_file: str | Path = DEFAULT_CACHE_FILE) -> None:
+        """Persist the entries to ``cache_file``, replacing it atomically."""
+        with self._lock:
+            entries = [[key, sig[0], sig[1], info] for key, (sig, info) in self._entries.items()]
+        cache_file = Path(cache_file)
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, "w", encoding="utf-8") as handle:
+                json.dump(entries, handle, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            tmp_file.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -1,16 +1,31 @@
 ﻿from __future__ import annotations
 
+import os
 import re
 import subprocess
 import time
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Callable, Iterable, List
+from typing import Callable, List
 
+from .progress_pump import LINE_SPLIT_RE, READ_CHUNK_SIZE, shared_pump
+from .spawn import FAST_SPAWN_KWARGS
+from .stream_tail import StreamTail
 from .types import CommandResult, FFmpegError
 
-TIME_RE = re.compile(r"time=(\d+):(\d+):(\d+\.?\d*)")
-FRAME_RE = re.compile(r"frame=\s*(\d+)")
-SPEED_RE = re.compile(r"speed=\s*([\d\.]+)x")
+# Global options asking FFmpeg for machine-readable key=value progress on stdout
+# instead of the human-readable stats line on stderr.
+PROGRESS_ARGS = ("-progress", "pipe:1", "-nostats")
+
+# Legacy fallback: scrape the stderr stats line.
+PROGRESS_RE = re.compile(rb"time=(\d+):(\d+):(\d+\.?\d*)|frame=\s*(\d+)|speed=\s*([\d.]+)x")
+
+# Minimum spacing between two progress callbacks, in nanoseconds.
+CALLBACK_INTERVAL_NS = 50_000_000
+
+
+# Receives the FFmpeg process right after it is started (e.g. to allow cancellation).
+SpawnCallback = Callable[[subprocess.Popen], None]
 
 
 @dataclass(slots=True)
@@ -25,98 +40,258 @@ class ProgressUpdate:
     return_code: int | None = None
 
 
-def _parse_timecode(match: re.Match[str]) -> float:
-    hours, minutes, seconds = match.groups()
+def _parse_timecode(hours: bytes, minutes: bytes, seconds: bytes) -> float:
     return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
 
 
+def with_progress_args(command: List[str]) -> List[str]:
+    """Return ``command`` with the ``-progress`` sink enabled right after the executable."""
+    return [command[0], *PROGRESS_ARGS, *command[1:]]
+
+
 def run_with_progress(
     command: List[str],
     total_duration: float | None,
     callback: Callable[[ProgressUpdate], None],
     *,
     check: bool = True,
+    on_spawn: SpawnCallback | None = None,
 ) -> CommandResult:
+    structured = PROGRESS_ARGS[0] in command
     process = subprocess.Popen(
         command,
-        stdout=subprocess.DEVNULL,
+        stdout=subprocess.PIPE if structured else subprocess.DEVNULL,
         stderr=subprocess.PIPE,
-        universal_newlines=True,
-        encoding="utf-8",
-        errors="ignore",
-        bufsize=1,
+        bufsize=0,
+        **FAST_SPAWN_KWARGS,
     )
+    pump = shared_pump()
+    # With -progress the stats go to stdout; stderr only carries the log, of which
+    # the tail is kept for error reporting.
+    stderr_tail = StreamTail(process.stderr, pump=pump) if structured else None
+    if on_spawn:
+        on_spawn(process)
+
+    stream = process.stdout if structured else process.stderr
+    if stream is None:
+        raise RuntimeError("a progress pipe is required for progress monitoring")
 
-    start_time = time.time()
-    last_progress = 0.0
+    start_ns = time.monotonic_ns()
+    parser: _ProgressParser
+    if structured:
+        parser = _ProgressPipeParser(total_duration, start_ns)
+    else:
+        parser = _StatsLineParser(total_duration, start_ns)
+    dispatcher = _ThrottledDispatcher(callback)
 
-    if process.stderr is None:
-        raise RuntimeError("stderr pipe is required for progress monitoring")
+    def on_data(chunk: bytes) -> None:
+        for update in parser.feed(chunk):
+            dispatcher.offer(update)
 
-    for line in process.stderr:
-        progress = _create_progress_update(line.rstrip(), total_duration, start_time)
-        if progress.progress is not None:
-            last_progress = progress.progress
-        callback(progress)
+    def on_eof() -> None:
+        for update in parser.finish():
+            dispatcher.offer(update)
+
+    if pump is not None:
+        # Parsing and callbacks happen on the shared pump thread; this thread only waits.
+        registration = pump.register(stream, on_data, on_eof)
+        registration.wait()
+        if registration.error is not None:
+            process.kill()
+            process.wait()
+            registration.raise_error()
+    else:
+        fd = stream.fileno()
+        while chunk := os.read(fd, READ_CHUNK_SIZE):
+            on_data(chunk)
+        on_eof()
+        stream.close()
 
     return_code = process.wait()
-    final_update = ProgressUpdate(
-        progress=1.0 if return_code == 0 else last_progress,
-        current_time=total_duration if return_code == 0 else None,
-        current_frame=None,
-        speed=None,
-        eta=0 if return_code == 0 else None,
-        raw=f"FFmpeg exited with code {return_code}",
-        done=True,
-        return_code=return_code,
+    stderr = stderr_tail.text() if stderr_tail is not None else ""
+    succeeded = return_code == 0
+    dispatcher.finish(
+        ProgressUpdate(
+            1.0 if succeeded else dispatcher.last_progress,
+            total_duration if succeeded else None,
+            None,
+            None,
+            0 if succeeded else None,
+            f"FFmpeg exited with code {return_code}",
+            True,
+            return_code,
+        )
     )
-    callback(final_update)
 
     if check and return_code != 0:
         raise FFmpegError(
             f"FFmpeg exited with code {return_code}",
             command,
             stdout="",
-            stderr="",
+            stderr=stderr,
         )
 
-    return CommandResult(return_code, "", "", command)
+    return CommandResult(return_code, "", stderr, command)
 
 
-def _create_progress_update(line: str, total_duration: float | None, start_time: float) -> ProgressUpdate:
-    current_time = None
-    progress_value = None
-    eta = None
-    speed_val = None
-    frame_val = None
+@dataclass(slots=True)
+class _ThrottledDispatcher:
+    """Coalesce updates into at most one callback per ``CALLBACK_INTERVAL_NS``.
+
+    Callbacks usually end in a cross-thread Qt signal, so the newest update replaces
+    any pending one instead of queuing behind it.
+    """
+
+    callback: Callable[[ProgressUpdate], None]
+    last_progress: float = 0.0
+    last_fire_ns: int = 0
+    pending: ProgressUpdate | None = None
+
+    def offer(self, update: ProgressUpdate) -> None:
+        if update.progress is not None:
+            self.last_progress = update.progress
+        self.pending = update
+        now_ns = time.monotonic_ns()
+        if now_ns - self.last_fire_ns > CALLBACK_INTERVAL_NS:
+            self.pending = None
+            self.last_fire_ns = now_ns
+            self.callback(update)
+
+    def finish(self, final: ProgressUpdate) -> None:
+        """Deliver the terminal ``done`` update unconditionally; it supersedes any pending one."""
+        self.pending = None
+        self.callback(final)
+
+
+class _ProgressParser(ABC):
+    """Turns raw pipe chunks into ``ProgressUpdate`` objects for one FFmpeg run."""
+
+    def __init__(self, total_duration: float | None, start_ns: int) -> None:
+        self.total_duration = total_duration
+        self.start_ns = start_ns
+        self._carry = b""
+
+    @abstractmethod
+    def feed(self, chunk: bytes) -> List[ProgressUpdate]:
+        """Consume ``chunk`` and return the updates it completes."""
+
+    def finish(self) -> List[ProgressUpdate]:
+        return []
 
-    if match := TIME_RE.search(line):
-        current_time = _parse_timecode(match)
-        if total_duration and total_duration > 0:
-            progress_value = min(current_time / total_duration, 1.0)
 
-    if match := FRAME_RE.search(line):
-        frame_val = int(match.group(1))
+class _ProgressPipeParser(_ProgressParser):
+    """Parse the ``-progress`` key=value stream; one update per ``progress=`` block."""
 
-    if match := SPEED_RE.search(line):
+    def __init__(self, total_duration: float | None, start_ns: int) -> None:
+        super().__init__(total_duration, start_ns)
+        self._fields: dict[str, str] = {}
+
+    def feed(self, chunk: bytes) -> List[ProgressUpdate]:
+        *lines, self._carry = (self._carry + chunk).split(b"\n")
+        updates: List[ProgressUpdate] = []
+        for line in lines:
+            key, sep, value = line.decode("utf-8", "ignore").strip().partition("=")
+            if not sep:
+                continue
+            if key != "progress":
+                self._fields[key] = value
+                continue
+            updates.append(_update_from_fields(self._fields, self.total_duration, self.start_ns))
+            self._fields = {}
+        return updates
+
+
+class _StatsLineParser(_ProgressParser):
+    """Scrape the stderr stats line; one update per drained chunk."""
+
+    # FFmpeg rewrites its stats line with "\r" many times per second. Only the newest
+    # line of each chunk is parsed; intermediate lines carry nothing the final one
+    # does not.
+    def feed(self, chunk: bytes) -> List[ProgressUpdate]:
+        *lines, self._carry = LINE_SPLIT_RE.split(self._carry + chunk)
+        line = _latest_line(lines)
+        if line is None:
+            return []
+        return [_create_progress_update(line, self.total_duration, self.start_ns)]
+
+    def finish(self) -> List[ProgressUpdate]:
+        carry, self._carry = self._carry, b""
+        if not carry.strip():
+            return []
+        return [_create_progress_update(carry, self.total_duration, self.start_ns)]
+
+
+def _update_from_fields(fields: dict[str, str], total_duration: float | None, start_ns: int) -> ProgressUpdate:
+    current_time = frame_val = speed_val = None
+    # out_time_ms is historically also in microseconds; prefer the explicit key.
+    out_time = fields.get("out_time_us") or fields.get("out_time_ms")
+    if out_time and out_time != "N/A":
         try:
-            speed_val = float(match.group(1))
+            current_time = max(int(out_time), 0) / 1_000_000
+        except ValueError:
+            current_time = None
+    if (frame := fields.get("frame")) and frame.isdigit():
+        frame_val = int(frame)
+    if (speed := fields.get("speed")) and speed.endswith("x"):
+        try:
+            speed_val = float(speed[:-1])
         except ValueError:
             speed_val = None
+    raw = " ".join(f"{key}={value}" for key, value in fields.items())
+    return _build_update(current_time, frame_val, speed_val, total_duration, start_ns, raw)
+
+
+def _latest_line(lines: List[bytes]) -> bytes | None:
+    """Pick the newest stats line of a chunk, falling back to the newest non-empty one."""
+    fallback = None
+    for line in reversed(lines):
+        if b"time=" in line:
+            return line
+        if fallback is None and line.strip():
+            fallback = line
+    return fallback
+
+
+def _create_progress_update(line: bytes, total_duration: float | None, start_ns: int) -> ProgressUpdate:
+    current_time = None
+    speed_val = None
+    frame_val = None
+
+    for match in PROGRESS_RE.finditer(line):
+        hours, minutes, seconds, frame, speed = match.groups()
+        if hours is not None:
+            current_time = _parse_timecode(hours, minutes, seconds)
+        elif frame is not None:
+            frame_val = int(frame)
+        elif speed is not None:
+            try:
+                speed_val = float(speed)
+            except ValueError:
+                speed_val = None
+
+    raw = line.decode("utf-8", "ignore").strip()
+    return _build_update(current_time, frame_val, speed_val, total_duration, start_ns, raw)
+
+
+def _build_update(
+    current_time: float | None,
+    frame_val: int | None,
+    speed_val: float | None,
+    total_duration: float | None,
+    start_ns: int,
+    raw: str,
+) -> ProgressUpdate:
+    progress_value = None
+    eta = None
+    if current_time is not None and total_duration and total_duration > 0:
+        progress_value = min(current_time / total_duration, 1.0)
 
     if progress_value is not None:
         if speed_val and speed_val > 0 and total_duration:
             eta = max((total_duration - (current_time or 0)) / speed_val, 0)
-        else:
-            elapsed = time.time() - start_time
-            if progress_value > 0:
-                eta = max(elapsed / progress_value * (1 - progress_value), 0)
-
-    return ProgressUpdate(
-        progress=progress_value,
-        current_time=current_time,
-        current_frame=frame_val,
-        speed=speed_val,
-        eta=eta,
-        raw=line,
-    )
+        elif progress_value > 0:
+            # Only read the clock when FFmpeg did not report a speed.
+            elapsed = (time.monotonic_ns() - start_ns) / 1e9
+            eta = max(elapsed / progress_value * (1 - progress_value), 0)
+
+    return ProgressUpdate(progress_value, current_time, frame_val, speed_val, eta, raw)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import os
+import re
+import selectors
+from collections import deque
+from threading import Event, Lock, Thread
+from typing import IO, Callable
+
+READ_CHUNK_SIZE = 16384
+# FFmpeg separates log lines with "\n" but rewrites its stats line with "\r".
+LINE_SPLIT_RE = re.compile(rb"\r\n|[\r\n]")
+
+DataCallback = Callable[[bytes], None]
+EofCallback = Callable[[], None]
+
+
+class PumpRegistration:
+    """Handle for one stream served by the pump; ``wait()`` returns once it hit EOF."""
+
+    def __init__(self, stream: IO[bytes], on_data: DataCallback, on_eof: EofCallback | None) -> None:
+        self.stream = stream
+        self.on_data = on_data
+        self.on_eof = on_eof
+        self.error: BaseException | None = None
+        self._done = Event()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def raise_error(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+
+class ProgressPump:
+    """Single daemon thread draining the pipes of every running FFmpeg process.
+
+    Instead of one reader thread blocked per pipe, streams are multiplexed through
+    ``selectors.DefaultSelector`` (epoll on Linux, kqueue on macOS). Callbacks run on
+    the pump thread and must not block. Only usable where pipes are selectable, i.e.
+    not on Windows; see ``shared_pump``.
+    """
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._pending: deque[PumpRegistration] = deque()
+        self._lock = Lock()
+        self._thread: Thread | None = None
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+    def register(
+        self,
+        stream: IO[bytes],
+        on_data: DataCallback,
+        on_eof: EofCallback | None = None,
+    ) -> PumpRegistration:
+        """Feed every chunk read from ``stream`` to ``on_data``; the pump closes it at EOF."""
+        registration = PumpRegistration(stream, on_data, on_eof)
+        with self._lock:
+            # The selector is only touched by the pump thread; hand the stream over.
+            self._pending.append(registration)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="ffmpeg-progress-pump", daemon=True)
+                self._thread.start()
+        os.write(self._wakeup_w, b"\0")
+        return registration
+
+    def _run(self) -> None:
+        while True:
+            for key, _events in self._selector.select():
+                if key.data is None:
+                    self._accept_pending()
+                else:
+                    self._service(key.data)
+
+    def _accept_pending(self) -> None:
+        try:
+            while os.read(self._wakeup_r, 512):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+        for registration in pending:
+            self._selector.register(registration.stream.fileno(), selectors.EVENT_READ, registration)
+
+    def _service(self, registration: PumpRegistration) -> None:
+        try:
+            chunk = os.read(registration.stream.fileno(), READ_CHUNK_SIZE)
+            if chunk:
+                registration.on_data(chunk)
+                return
+            if registration.on_eof:
+                registration.on_eof()
+        except BaseException as exc:  # noqa: BLE001
+            # Surface the failure to the waiting thread rather than killing the pump.
+            registration.error = exc
+            if registration.on_eof:
+                try:
+                    registration.on_eof()
+                except BaseException:  # noqa: BLE001
+                    pass
+        self._selector.unregister(registration.stream.fileno())
+        registration.stream.close()
+        registration._done.set()
+
+
+_shared_pump: ProgressPump | None = None
+_shared_lock = Lock()
+
+
+def shared_pump() -> ProgressPump | None:
+    """Process-wide pump, or ``None`` where pipes cannot be polled (Windows)."""
+    global _shared_pump
+    if os.name != "posix":
+        return None
+    with _shared_lock:
+        if _shared_pump is None:
+            _shared_pump = ProgressPump()
+        return _shared_pump
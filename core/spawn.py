@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+
+# CPython launches children with posix_spawn (vfork-style, no page-table copy of our
+# large Qt heap) only when the executable path has a directory component and no
+# feature needing a fork is used: no preexec_fn, cwd, pass_fds, start_new_session,
+# user/group changes, and - before 3.13 - close_fds=False. Every FFmpeg launch passes
+# these kwargs and an absolute executable so that path is taken. Our own descriptors
+# are non-inheritable (PEP 446), so not closing fds leaks nothing into the child.
+if sys.platform == "linux" and getattr(subprocess, "_USE_POSIX_SPAWN", False):
+    FAST_SPAWN_KWARGS: dict = {"close_fds": False}
+else:
+    FAST_SPAWN_KWARGS = {}
+
+
+def resolve_executable(name: str) -> str:
+    """Return the absolute path of ``name`` on PATH, or ``name`` unchanged if not found."""
+    return shutil.which(name) or name
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+from collections import deque
+from threading import Event, Thread
+from typing import IO
+
+from .progress_pump import LINE_SPLIT_RE, READ_CHUNK_SIZE, ProgressPump, shared_pump
+
+DEFAULT_TAIL_LINES = 256
+
+
+class StreamTail:
+    """Drain a binary pipe in the background, keeping only its last ``maxlen`` lines.
+
+    Reading continuously keeps the child from blocking on a full OS pipe buffer while
+    memory stays bounded no matter how long the process logs. The pipe is served by
+    the shared ``ProgressPump`` where available, otherwise by a daemon thread.
+    """
+
+    def __init__(
+        self,
+        stream: IO[bytes],
+        maxlen: int = DEFAULT_TAIL_LINES,
+        *,
+        pump: ProgressPump | None = None,
+        name: str = "ffmpeg-stderr",
+    ) -> None:
+        self.lines: deque[bytes] = deque(maxlen=maxlen)
+        self._carry = b""
+        self._closed = Event()
+        pump = pump or shared_pump()
+        if pump is not None:
+            pump.register(stream, self.feed, self.finish)
+        else:
+            Thread(target=self._drain, args=(stream,), name=name, daemon=True).start()
+
+    def feed(self, chunk: bytes) -> None:
+        *lines, self._carry = LINE_SPLIT_RE.split(self._carry + chunk)
+        self.lines.extend(line for line in lines if line)
+
+    def finish(self) -> None:
+        if self._carry:
+            self.lines.append(self._carry)
+            self._carry = b""
+        self._closed.set()
+
+    def _drain(self, stream: IO[bytes]) -> None:
+        fd = stream.fileno()
+        try:
+            while chunk := os.read(fd, READ_CHUNK_SIZE):
+                self.feed(chunk)
+        except OSError:
+            pass
+        finally:
+            stream.close()
+            self.finish()
+
+    def text(self, timeout: float | None = None) -> str:
+        """Wait for the stream to close and return the retained tail as text."""
+        self._closed.wait(timeout)
+        return "\n".join(line.decode("utf-8", "ignore") for line in self.lines)
@@ -1,20 +1,24 @@
 ﻿from __future__ import annotations
 
-from concurrent.futures import Future, ThreadPoolExecutor
+import itertools
+import os
+import subprocess
 from dataclasses import dataclass, field
 from enum import Enum, auto
 from pathlib import Path
-from threading import Lock
-from typing import Callable, Dict, Mapping, Sequence
+from queue import PriorityQueue
+from threading import BoundedSemaphore, Lock, Thread
+from typing import Callable, Dict, List, Mapping, Sequence
 from uuid import uuid4
 
 from .ffmpeg_service import FFmpegService, ProgressCallback
-from .ffmpeg_wrapper import InputSpec
+from .ffmpeg_wrapper import InputSpec, OutputSpec
 
 
 class TaskType(Enum):
     CONVERT = auto()
     MERGE = auto()
+    MULTI_CONVERT = auto()
 
 
 class TaskStatus(Enum):
@@ -29,30 +33,65 @@ class TaskStatus(Enum):
 class Task:
     task_id: str
     task_type: TaskType
-    input_data: object
-    output: Path
+    input_data: str | List[InputSpec]
+    output: str | List[str]
     params: Mapping[str, object]
     status: TaskStatus = TaskStatus.QUEUED
     error: str | None = None
-    future: Future | None = None
+    priority: int = 0
+    process: subprocess.Popen | None = None
+    cancel_requested: bool = False
     metadata: dict = field(default_factory=dict)
 
 
+def available_cpus() -> int:
+    """Number of CPUs this process may run on (honours affinity masks where supported)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Grace period between SIGTERM and SIGKILL when cancelling a running job.
+TERMINATE_TIMEOUT = 2.0
+
+
 class TaskManager:
-    """Threaded task runner coordinating FFmpeg jobs without blocking the GUI."""
+    """Threaded task runner coordinating FFmpeg jobs without blocking the GUI.
+
+    Jobs wait in a priority queue (higher ``priority`` runs first, FIFO within a level)
+    drained by ``max_workers`` threads. By default that is
+    ``available_cpus() // threads_per_job`` and each FFmpeg process is capped at
+    ``threads_per_job`` threads so concurrent encoders do not fight over the same cores.
+    ``max_inflight`` bounds queued + running jobs; ``submit_*`` blocks once it is reached.
+    """
 
     def __init__(
         self,
         service: FFmpegService | None = None,
         *,
-        max_workers: int = 2,
+        max_workers: int | None = None,
+        threads_per_job: int = 4,
+        max_inflight: int | None = None,
         on_task_update: Callable[[Task], None] | None = None,
     ) -> None:
         self.service = service or FFmpegService()
-        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ffmpeg-task")
+        self.threads_per_job = max(1, threads_per_job)
+        if max_workers is None:
+            max_workers = max(1, available_cpus() // self.threads_per_job)
+        self.max_workers = max_workers
         self.on_task_update = on_task_update
         self.tasks: Dict[str, Task] = {}
         self._lock = Lock()
+        self._inflight = BoundedSemaphore(max_inflight) if max_inflight else None
+        self._queue: PriorityQueue = PriorityQueue()
+        self._sequence = itertools.count()
+        # Set by shutdown(); no workers remain to drain anything queued afterwards.
+        self._closed = False
+        self._workers: List[Thread] = []
+        for index in range(max_workers):
+            worker = Thread(target=self._worker_loop, name=f"ffmpeg-task_{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
 
     def submit_conversion(
         self,
@@ -62,11 +101,18 @@ class TaskManager:
         *,
         duration: float | None = None,
         progress: ProgressCallback | None = None,
+        priority: int = 0,
     ) -> Task:
-        task = Task(str(uuid4()), TaskType.CONVERT, Path(input_file), Path(output_file), params or {})
+        task = Task(
+            str(uuid4()),
+            TaskType.CONVERT,
+            os.fspath(input_file),
+            os.fspath(output_file),
+            self._with_thread_cap(params),
+            priority=priority,
+        )
         self._register_task(task)
-        future = self.executor.submit(self._run_conversion, task, duration, progress)
-        task.future = future
+        self._enqueue(task, self._run_conversion, duration, progress)
         return task
 
     def submit_merge(
@@ -77,43 +123,194 @@ class TaskManager:
         *,
         total_duration: float | None = None,
         progress: ProgressCallback | None = None,
+        priority: int = 0,
     ) -> Task:
-        task = Task(str(uuid4()), TaskType.MERGE, list(inputs), Path(output_file), params or {})
+        task = Task(
+            str(uuid4()),
+            TaskType.MERGE,
+            list(inputs),
+            os.fspath(output_file),
+            self._with_thread_cap(params),
+            priority=priority,
+        )
         self._register_task(task)
-        future = self.executor.submit(self._run_merge, task, total_duration, progress)
-        task.future = future
+        self._enqueue(task, self._run_merge, total_duration, progress)
         return task
 
+    def submit_multi_conversion(
+        self,
+        input_file: str | Path,
+        outputs: Sequence[OutputSpec],
+        params: Mapping[str, object] | None = None,
+        *,
+        duration: float | None = None,
+        progress: ProgressCallback | None = None,
+        priority: int = 0,
+    ) -> Task:
+        """Queue one FFmpeg run that writes every rendition in ``outputs``."""
+        task = Task(
+            str(uuid4()),
+            TaskType.MULTI_CONVERT,
+            os.fspath(input_file),
+            [os.fspath(output_file) for output_file, _ in outputs],
+            self._with_thread_cap(params),
+            priority=priority,
+        )
+        task.metadata["outputs"] = [
+            (os.fspath(output_file), self._with_thread_cap(output_params)) for output_file, output_params in outputs
+        ]
+        self._register_task(task)
+        self._enqueue(task, self._run_multi_conversion, duration, progress)
+        return task
+
+    def cancel(self, task_id: str) -> bool:
+        """Cancel a queued task or terminate the FFmpeg process of a running one."""
+        with self._lock:
+            task = self.tasks.get(task_id)
+            if task is None or task.cancel_requested:
+                return False
+            if task.status not in (TaskStatus.QUEUED, TaskStatus.RUNNING):
+                return False
+            task.cancel_requested = True
+            queued = task.status == TaskStatus.QUEUED
+            process = task.process
+        if queued:
+            self._update_task(task, TaskStatus.CANCELLED)
+        elif process is not None:
+            self._terminate(process)
+        return True
+
     def shutdown(self) -> None:
-        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._closed = True
+        for task_id in list(self.tasks):
+            self.cancel(task_id)
+        for _ in self._workers:
+            # Sentinels sort ahead of every real job so workers exit promptly.
+            self._queue.put((float("-inf"), next(self._sequence), None))
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
+    def _with_thread_cap(self, params: Mapping[str, object] | None) -> Mapping[str, object]:
+        params = dict(params or {})
+        params.setdefault("threads", self.threads_per_job)
+        return params
+
+    def _enqueue(self, task: Task, runner: Callable[..., None], *args: object) -> None:
+        if self._inflight is not None:
+            self._inflight.acquire()
+        self._queue.put((-task.priority, next(self._sequence), (task, runner, args)))
+
+    def _worker_loop(self) -> None:
+        while True:
+            _, _, item = self._queue.get()
+            if item is None:
+                return
+            task, runner, args = item
+            try:
+                with self._lock:
+                    if task.cancel_requested:
+                        continue
+                    task.status = TaskStatus.RUNNING
+                runner(task, *args)
+            finally:
+                if self._inflight is not None:
+                    self._inflight.release()
+
+    def _attach_process(self, task: Task, process: subprocess.Popen) -> None:
+        with self._lock:
+            task.process = process
+            cancelled = task.cancel_requested
+        if cancelled:
+            self._terminate(process)
+
+    def _terminate(self, process: subprocess.Popen) -> None:
+        """Signal ``process`` right away; only the wait-then-kill escalation runs on a thread.
+
+        The helper thread is a daemon and dies with the interpreter, so the terminate
+        itself must not depend on it.
+        """
+        if process.poll() is not None:
+            return
+        process.terminate()
+        Thread(target=self._kill_after_grace, args=(process,), name="ffmpeg-terminate", daemon=True).start()
+
+    @staticmethod
+    def _kill_after_grace(process: subprocess.Popen) -> None:
+        try:
+            process.wait(timeout=TERMINATE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
     def _register_task(self, task: Task) -> None:
         with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot submit tasks after shutdown")
             self.tasks[task.task_id] = task
         self._update_task(task, TaskStatus.QUEUED)
 
     def _run_conversion(self, task: Task, duration: float | None, progress: ProgressCallback | None) -> None:
         self._update_task(task, TaskStatus.RUNNING)
         try:
-            self.service.convert(task.input_data, task.output, task.params, duration=duration, callback=progress)
+            self.service.convert(
+                task.input_data,
+                task.output,
+                task.params,
+                duration=duration,
+                callback=progress,
+                on_spawn=lambda process: self._attach_process(task, process),
+            )
+        except Exception as exc:  # noqa: BLE001
+            self._fail_task(task, exc)
+        else:
+            self._update_task(task, TaskStatus.COMPLETED)
+        finally:
+            task.process = None
+
+    def _run_multi_conversion(self, task: Task, duration: float | None, progress: ProgressCallback | None) -> None:
+        self._update_task(task, TaskStatus.RUNNING)
+        try:
+            self.service.convert_multi(
+                task.input_data,
+                task.metadata["outputs"],
+                task.params,
+                duration=duration,
+                callback=progress,
+                on_spawn=lambda process: self._attach_process(task, process),
+            )
         except Exception as exc:  # noqa: BLE001
-            task.error = str(exc)
-            self._update_task(task, TaskStatus.FAILED)
+            self._fail_task(task, exc)
         else:
             self._update_task(task, TaskStatus.COMPLETED)
+        finally:
+            task.process = None
 
     def _run_merge(self, task: Task, duration: float | None, progress: ProgressCallback | None) -> None:
         self._update_task(task, TaskStatus.RUNNING)
         try:
-            self.service.merge(task.input_data, task.output, task.params, total_duration=duration, callback=progress)
+            self.service.merge(
+                task.input_data,
+                task.output,
+                task.params,
+                total_duration=duration,
+                callback=progress,
+                on_spawn=lambda process: self._attach_process(task, process),
+            )
         except Exception as exc:  # noqa: BLE001
-            task.error = str(exc)
-            self._update_task(task, TaskStatus.FAILED)
+            self._fail_task(task, exc)
         else:
             self._update_task(task, TaskStatus.COMPLETED)
+        finally:
+            task.process = None
+
+    def _fail_task(self, task: Task, exc: Exception) -> None:
+        # A process killed through cancel() exits non-zero; that is not a failure.
+        if task.cancel_requested:
+            self._update_task(task, TaskStatus.CANCELLED)
+            return
+        task.error = str(exc)
+        self._update_task(task, TaskStatus.FAILED)
 
     def _update_task(self, task: Task, status: TaskStatus) -> None:
         task.status = status
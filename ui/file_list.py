@@ -1,9 +1,9 @@
 ﻿from __future__ import annotations
 
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Sequence, Tuple
 
-from PyQt5.QtCore import QAbstractAnimation, QEasingCurve, QPropertyAnimation, QSize, Qt, pyqtSignal
+from PyQt5.QtCore import QAbstractAnimation, QEasingCurve, QPropertyAnimation, QSize, Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QDropEvent, QIcon
 from PyQt5.QtWidgets import (
     QFileDialog,
@@ -25,12 +25,18 @@ class FileListWidget(QWidget):
 
     startRequested = pyqtSignal()
     mergeRequested = pyqtSignal()
-    filesChanged = pyqtSignal(list)
+    # Carries the shared get_files_view() tuple; receivers must not expect a list.
+    filesChanged = pyqtSignal(tuple)
+    filesRemoved = pyqtSignal(list)
     selectionChanged = pyqtSignal(str)
 
     def __init__(self, parent: QWidget | None = None) -> None:
         super().__init__(parent)
         self._busy = False
+        # Mirror of the list rows, so reads never walk the Qt model item by item.
+        self._files: List[str] = []
+        self._files_view: Tuple[str, ...] | None = None
+        self._files_changed_pending = False
         self._build_ui()
         self.setAcceptDrops(True)
         self._setup_animations()
@@ -70,6 +76,8 @@ class FileListWidget(QWidget):
         self.list_widget.setSelectionMode(QListWidget.ExtendedSelection)
         self.list_widget.setAlternatingRowColors(True)
         self.list_widget.itemSelectionChanged.connect(self._emit_selection)
+        self.list_widget.model().rowsMoved.connect(self._resync_files)
+        self._item_by_path: Dict[str, QListWidgetItem] = {}
         layout.addWidget(self.list_widget, stretch=1)
 
         self.hint_label = QLabel("拖放文件到此处即可加入任务")
@@ -94,23 +102,66 @@ class FileListWidget(QWidget):
             self.add_files(files)
 
     def remove_selected(self) -> None:
-        for item in self.list_widget.selectedItems():
-            row = self.list_widget.row(item)
-            self.list_widget.takeItem(row)
+        self._remove_rows(self.list_widget.row(item) for item in self.list_widget.selectedItems())
+
+    def remove_files(self, paths: Iterable[str]) -> None:
+        """批量移除文件：列表只重绘一次，filesRemoved 只发出一次。"""
+        items = (self._item_by_path.get(path) for path in dict.fromkeys(paths))
+        self._remove_rows(self.list_widget.row(item) for item in items if item is not None)
+
+    def _remove_rows(self, rows: Iterable[int]) -> None:
+        # Highest row first, so earlier removals never shift the rows still to go.
+        rows = sorted(rows, reverse=True)
+        if not rows:
+            return
+        removed: List[str] = []
+        self.list_widget.setUpdatesEnabled(False)
+        # One selection notification for the whole batch instead of one per row.
+        blocked = self.list_widget.blockSignals(True)
+        try:
+            for row in rows:
+                self.list_widget.takeItem(row)
+                path = self._files.pop(row)
+                self._item_by_path.pop(path, None)
+                removed.append(path)
+        finally:
+            self.list_widget.blockSignals(blocked)
+            self.list_widget.setUpdatesEnabled(True)
         self._update_state()
+        self._emit_selection()
+        removed.reverse()
+        self.filesRemoved.emit(removed)
 
     def add_files(self, files: Iterable[str | Path]) -> None:
-        for path in files:
-            self.list_widget.addItem(QListWidgetItem(str(path)))
+        # Paths are unique keys of the list; re-adding a listed file is a no-op.
+        paths = list(dict.fromkeys(str(path) for path in files if str(path) not in self._item_by_path))
+        first_row = len(self._files)
+        self._files.extend(paths)
+        self.list_widget.addItems(paths)
+        for offset, path in enumerate(paths):
+            self._item_by_path[path] = self.list_widget.item(first_row + offset)
         self._stop_pulse()
         self._update_state()
 
     def get_files(self) -> List[str]:
-        return [self.list_widget.item(i).text() for i in range(self.list_widget.count())]
+        return list(self._files)
+
+    def get_files_view(self) -> Tuple[str, ...]:
+        """文件列表的只读快照（元组），仅在列表变化后重建。"""
+        if self._files_view is None:
+            self._files_view = tuple(self._files)
+        return self._files_view
 
     def get_selected_files(self) -> List[str]:
         return [item.text() for item in self.list_widget.selectedItems()]
 
+    def get_files_for_action(self) -> Sequence[str]:
+        """选中的文件；没有选中时返回全部文件（只读快照，不复制）。"""
+        selected = self.list_widget.selectedItems()
+        if selected:
+            return [item.text() for item in selected]
+        return self.get_files_view()
+
     def dragEnterEvent(self, event: QDropEvent) -> None:  # noqa: N802
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
@@ -147,25 +198,41 @@ class FileListWidget(QWidget):
         self.selectionChanged.emit(item.text() if item else "")
 
     def _update_state(self) -> None:
-        files = self.get_files()
-        has_files = bool(files)
-        has_multi = len(files) >= 2
+        self._files_view = None
+        count = len(self._files)
+        has_files = count > 0
+        has_multi = count >= 2
         enabled = has_files and not self._busy
         self.start_button.setEnabled(enabled)
         self.merge_button.setEnabled(has_multi and not self._busy)
         self.remove_button.setEnabled(has_files and not self._busy)
-        self.filesChanged.emit(files)
+        self._schedule_files_changed()
+
+    def _schedule_files_changed(self) -> None:
+        # Several drops/removals in one event-loop turn produce a single emission.
+        if not self._files_changed_pending:
+            self._files_changed_pending = True
+            QTimer.singleShot(0, self._emit_files_changed)
+
+    def _emit_files_changed(self) -> None:
+        self._files_changed_pending = False
+        self.filesChanged.emit(self.get_files_view())
 
     def remove_file(self, path: str) -> None:
-        matches = self.list_widget.findItems(path, Qt.MatchExactly)
-        if matches:
-            row = self.list_widget.row(matches[0])
-            self.list_widget.takeItem(row)
-            self._update_state()
+        self.remove_files([path])
+
+    def _resync_files(self, *_args) -> None:
+        # Items survive a move, only their order changes.
+        self._files = [self.list_widget.item(i).text() for i in range(self.list_widget.count())]
+        self._update_state()
 
     def clear_all(self) -> None:
+        removed, self._files = self._files, []
+        self._item_by_path.clear()
         self.list_widget.clear()
         self._update_state()
+        if removed:
+            self.filesRemoved.emit(removed)
 
     def set_busy(self, busy: bool) -> None:
         self._busy = busy
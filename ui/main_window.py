@@ -1,11 +1,13 @@
 ﻿from __future__ import annotations
 
-import copy
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Tuple
 
-from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtCore import QThreadPool, pyqtSignal
 from PyQt5.QtWidgets import (
     QApplication,
     QHBoxLayout,
@@ -24,6 +26,16 @@ from .file_list import FileListWidget
 from .preview_window import PreviewWindow
 from .settings_panel import SettingsPanel
 from .theme import apply_theme
+from .workers import BackgroundWorker
+
+
+# Label the settings panel uses for "let FFmpeg decide".
+_AUTO = "自动"
+_CHANNEL_MAP = {"单声道": 1, "立体声": 2, "5.1": 6}
+_HWACCEL_MAP = {_AUTO: "auto", "CPU": "none", "NVENC": "nvenc", "QuickSync": "qsv", "AMF": "amf"}
+# Every job the panel can produce re-encodes (even "自动" lets FFmpeg pick libx264),
+# so jobs are CPU-bound and only two run at once.
+_MAX_PARALLEL_JOBS = 2
 
 
 @dataclass
@@ -31,35 +43,79 @@ class Job:
     kind: str  # "convert" or "merge"
     files: List[str]
     settings: Dict[str, Any]
+    task_id: str | None = None
+    progress: float = 0.0
+
+
+@dataclass(slots=True)
+class MediaInfo:
+    """The ffprobe fields the job queue needs, parsed once per probe."""
+
+    width: int | None
+    height: int | None
+    has_audio: bool
+    duration: float
+
+    @classmethod
+    def from_probe(cls, info: Dict[str, Any]) -> MediaInfo:
+        width = height = None
+        has_audio = False
+        for stream in info.get("streams", []):
+            codec_type = stream.get("codec_type")
+            if codec_type == "video" and width is None and stream.get("width") and stream.get("height"):
+                width = int(stream["width"])
+                height = int(stream["height"])
+            elif codec_type == "audio":
+                has_audio = True
+            if width is not None and has_audio:
+                break
+        try:
+            duration = float(info.get("format", {}).get("duration", 0) or 0)
+        except (TypeError, ValueError):
+            duration = 0.0
+        return cls(width, height, has_audio, duration)
 
 
-class _UiSignals(QObject):
-    progressChanged = pyqtSignal(float, str)
-    statusChanged = pyqtSignal(str)
-    taskFailed = pyqtSignal(str)
-    taskCompleted = pyqtSignal()
+def _clone_settings(settings: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-job copy of ``SettingsPanel.export_settings()``; its sections only hold primitives."""
+    return {section: dict(values) for section, values in settings.items()}
 
 
 class MainWindow(QMainWindow):
     """整合文件列表、预览窗口、参数面板并驱动 FFmpeg 任务队列。"""
 
+    # Emitted from TaskManager threads too; AutoConnection queues those onto the GUI thread.
+    progressChanged = pyqtSignal(float, str)
+    statusChanged = pyqtSignal(str)
+    taskFailed = pyqtSignal(str)
+    taskCompleted = pyqtSignal()
+    taskUpdated = pyqtSignal(object)
+
     def __init__(self) -> None:
         super().__init__()
         self.setWindowTitle("FFmpeg 媒体工作台")
         self.resize(1400, 800)
 
         self.ffmpeg_service = FFmpegService()
-        self.task_manager = TaskManager(self.ffmpeg_service, on_task_update=self._handle_task_update)
-        self.signals = _UiSignals()
-        self.signals.progressChanged.connect(self._apply_progress)
-        self.signals.statusChanged.connect(self._set_status_text)
-        self.signals.taskFailed.connect(self._on_task_failed)
-        self.signals.taskCompleted.connect(self._on_task_completed)
-
-        self.active_task_id: str | None = None
+        # ffprobe results from earlier sessions; entries are revalidated by mtime/size.
+        self.ffmpeg_service.load_probe_cache()
+        self.progressChanged.connect(self._apply_progress)
+        self.statusChanged.connect(self._set_status_text)
+        self.taskFailed.connect(self._on_task_failed)
+        self.taskCompleted.connect(self._on_task_completed)
+        self.taskUpdated.connect(self._handle_task_update)
+        self.task_manager = TaskManager(self.ffmpeg_service, on_task_update=self.taskUpdated.emit)
+        # ffprobe is I/O-bound; merges probe their inputs concurrently.
+        self._probe_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ffprobe")
+
+        # Submitted jobs by task id, and jobs whose media is still being probed.
+        self.active_task_ids: Dict[str, Job] = {}
+        self.starting_jobs: List[Job] = []
         self.pending_jobs: List[Job] = []
-        self.current_job: Job | None = None
-        self.current_progress = 0.0
+        # Last progress pushed to the status bar, for throttling _progress_callback.
+        self._last_emit_ts = 0.0
+        self._last_emit_pct = -1.0
+        self._mkdir_done: set[Path] = set()
 
         self._build_ui()
         self._connect_signals()
@@ -75,14 +131,14 @@ class MainWindow(QMainWindow):
 
         self.file_panel = FileListWidget()
         self.file_panel.setFixedWidth(320)
-        layout.addWidget(self._wrap_panel(self.file_panel, "文件"))
+        layout.addWidget(self._wrap_panel(self.file_panel))
 
         self.preview_panel = PreviewWindow()
-        layout.addWidget(self._wrap_panel(self.preview_panel, "预览"), stretch=2)
+        layout.addWidget(self._wrap_panel(self.preview_panel), stretch=2)
 
         self.settings_panel = SettingsPanel()
         self.settings_panel.setFixedWidth(320)
-        layout.addWidget(self._wrap_panel(self.settings_panel, "参数"))
+        layout.addWidget(self._wrap_panel(self.settings_panel))
 
         self.setCentralWidget(central)
         self._build_status_bar()
@@ -91,14 +147,15 @@ class MainWindow(QMainWindow):
         self.file_panel.startRequested.connect(self._queue_conversions)
         self.file_panel.mergeRequested.connect(self._queue_merge)
         self.file_panel.selectionChanged.connect(self.preview_panel.load_media)
+        self.file_panel.filesRemoved.connect(self._invalidate_probes)
 
-    def _wrap_panel(self, widget: QWidget, title: str) -> QWidget:
+    def _wrap_panel(self, widget: QWidget) -> QWidget:
         container = QWidget()
         wrapper = QHBoxLayout(container)
         wrapper.setContentsMargins(0, 0, 0, 0)
         wrapper.addWidget(widget)
+        # Only panelRole is matched by the stylesheet; extra dynamic properties cost a re-polish.
         container.setProperty("panelRole", "container")
-        container.setProperty("title", title)
         return container
 
     def _build_status_bar(self) -> None:
@@ -116,21 +173,21 @@ class MainWindow(QMainWindow):
     # Job queue helpers
     # ------------------------------------------------------------------
     def _queue_conversions(self) -> None:
-        files = self.file_panel.get_selected_files() or self.file_panel.get_files()
+        files = self.file_panel.get_files_for_action()
         if not files:
             QMessageBox.information(self, "提示", "请先添加需要转换的文件。")
             return
 
         settings = self.settings_panel.export_settings()
-        jobs = [Job("convert", [path], copy.deepcopy(settings)) for path in files]
+        jobs = [Job("convert", [path], _clone_settings(settings)) for path in files]
         self._enqueue_jobs(jobs)
 
     def _queue_merge(self) -> None:
-        files = self.file_panel.get_files()
+        files = self.file_panel.get_files_view()
         if len(files) < 2:
             QMessageBox.information(self, "提示", "至少选择两个文件才能合并。")
             return
-        settings = copy.deepcopy(self.settings_panel.export_settings())
+        settings = _clone_settings(self.settings_panel.export_settings())
         self._enqueue_jobs([Job("merge", list(files), settings)])
 
     def _enqueue_jobs(self, jobs: List[Job]) -> None:
@@ -138,18 +195,19 @@ class MainWindow(QMainWindow):
         self._start_next_job()
 
     def _start_next_job(self) -> None:
-        if self.active_task_id or not self.pending_jobs:
-            if not self.active_task_id:
-                self.signals.statusChanged.emit("就绪")
-            return
-
-        job = self.pending_jobs.pop(0)
-        self.current_job = job
-        self.current_progress = 0.0
-        if job.kind == "convert":
-            self._execute_conversion_job(job)
-        else:
-            self._execute_merge_job(job)
+        while self.pending_jobs and self._running_count() < _MAX_PARALLEL_JOBS:
+            job = self.pending_jobs.pop(0)
+            self.starting_jobs.append(job)
+            self.file_panel.set_busy(True)
+            if job.kind == "convert":
+                self._execute_conversion_job(job)
+            else:
+                self._execute_merge_job(job)
+        if not self._running_count():
+            self.statusChanged.emit("就绪")
+
+    def _running_count(self) -> int:
+        return len(self.active_task_ids) + len(self.starting_jobs)
 
     # ------------------------------------------------------------------
     # Job execution
@@ -159,53 +217,68 @@ class MainWindow(QMainWindow):
         settings = job.settings
         params = self._build_params(settings)
 
-        if not settings["output"]["path"].strip():
-            default_target = file_path.with_suffix(f".{settings['output']['format']}")
-            settings["output"]["path"] = str(default_target)
-
         try:
             output_path = self._resolve_output_path(file_path, settings)
         except OSError as exc:  # noqa: BLE001
             QMessageBox.critical(self, "输出路径错误", str(exc))
-            self._finish_job(success=False)
+            self._finish_job(job, success=False)
             return
 
-        duration = self._probe_duration(file_path)
+        self.statusChanged.emit(f"正在读取媒体信息：{file_path.name}")
+        self._run_in_background(self._probe_conversion, job, output_path, params, done=self._submit_conversion)
+
+    def _probe_conversion(
+        self, job: Job, output_path: Path, params: Dict[str, Dict[str, Any]]
+    ) -> Tuple[Job, Path, Dict[str, Dict[str, Any]], float | None]:
+        return job, output_path, params, self._probe_duration(Path(job.files[0]))
+
+    def _submit_conversion(self, result: Tuple[Job, Path, Dict[str, Dict[str, Any]], float | None]) -> None:
+        job, output_path, params, duration = result
+        if job not in self.starting_jobs:
+            # Dropped while probing because the window closed.
+            return
+        file_path = Path(job.files[0])
         try:
             task = self.task_manager.submit_conversion(
                 file_path,
                 output_path,
                 params,
                 duration=duration,
-                progress=self._progress_callback,
+                progress=functools.partial(self._progress_callback, job),
             )
         except Exception as exc:  # noqa: BLE001
             QMessageBox.critical(self, "任务提交失败", str(exc))
-            self._finish_job(success=False)
+            self._finish_job(job, success=False)
             return
 
-        self._mark_task_active(task.task_id)
-        self.signals.statusChanged.emit(f"正在转换：{file_path.name}")
+        self._mark_task_active(job, task.task_id)
+        self.statusChanged.emit(f"正在转换：{file_path.name}")
 
     def _execute_merge_job(self, job: Job) -> None:
+        self.statusChanged.emit("正在读取媒体信息…")
+        self._run_in_background(self._probe_merge, job, done=self._submit_merge)
+
+    def _probe_merge(self, job: Job) -> Tuple[Job, List[Dict[str, Any]], List[float]]:
+        specs, durations = self._collect_media_specs(job.files)
+        return job, specs, durations
+
+    def _submit_merge(self, result: Tuple[Job, List[Dict[str, Any]], List[float]]) -> None:
+        job, specs, durations = result
+        if job not in self.starting_jobs:
+            return
         settings = job.settings
         params = self._build_params(settings)
-        specs, durations = self._collect_media_specs(job.files)
         if not specs:
             QMessageBox.critical(self, "合并失败", "无法读取媒体信息。")
-            self._finish_job(success=False)
+            self._finish_job(job, success=False)
             return
 
         first_path = Path(specs[0]["path"])  # type: ignore[index]
-        if not settings["output"]["path"].strip():
-            default_target = first_path.with_name(f"{first_path.stem}_merged.{settings['output']['format']}")
-            settings["output"]["path"] = str(default_target)
-
         try:
-            output_path = self._resolve_output_path(first_path, settings)
+            output_path = self._resolve_output_path(first_path, settings, default_suffix="_merged")
         except OSError as exc:  # noqa: BLE001
             QMessageBox.critical(self, "输出路径错误", str(exc))
-            self._finish_job(success=False)
+            self._finish_job(job, success=False)
             return
 
         total_duration = sum(durations) if any(durations) else None
@@ -216,20 +289,34 @@ class MainWindow(QMainWindow):
                 output_path,
                 params,
                 total_duration=total_duration,
-                progress=self._progress_callback,
+                progress=functools.partial(self._progress_callback, job),
             )
         except Exception as exc:  # noqa: BLE001
             QMessageBox.critical(self, "合并任务提交失败", str(exc))
-            self._finish_job(success=False)
+            self._finish_job(job, success=False)
             return
 
-        self._mark_task_active(task.task_id)
-        self.signals.statusChanged.emit("正在合并…")
+        self._mark_task_active(job, task.task_id)
+        self.statusChanged.emit("正在合并…")
 
-    def _mark_task_active(self, task_id: str) -> None:
-        self.active_task_id = task_id
-        self.file_panel.set_busy(True)
-        self.progress_bar.setValue(0)
+    def _run_in_background(self, fn: Callable[..., Any], *args: Any, done: Callable[[Any], None]) -> None:
+        """在线程池中执行 ``fn``，结果经排队信号交给 ``done``（主线程）。"""
+        worker = BackgroundWorker(fn, *args)
+        # Bound methods of this QObject, so delivery is queued onto the GUI thread.
+        worker.signals.finished.connect(done)
+        worker.signals.failed.connect(self._on_background_failed)
+        QThreadPool.globalInstance().start(worker)
+
+    def _on_background_failed(self, args: Tuple[Any, ...], error: str) -> None:
+        if args[0] not in self.starting_jobs:
+            return
+        QMessageBox.critical(self, "读取媒体信息失败", error)
+        self._finish_job(args[0], success=False)
+
+    def _mark_task_active(self, job: Job, task_id: str) -> None:
+        self.starting_jobs.remove(job)
+        job.task_id = task_id
+        self.active_task_ids[task_id] = job
 
     # ------------------------------------------------------------------
     # Parameter & probe helpers
@@ -237,43 +324,38 @@ class MainWindow(QMainWindow):
     def _collect_media_specs(self, files: List[str]) -> Tuple[List[Dict[str, Any]], List[float]]:
         specs: List[Dict[str, Any]] = []
         durations: List[float] = []
-        for path in files:
-            info = self._probe_info(Path(path))
-            width = height = None
-            has_audio = False
-            duration = 0.0
-            if info:
-                for stream in info.get("streams", []):
-                    if stream.get("codec_type") == "video" and stream.get("width") and stream.get("height"):
-                        width = int(stream["width"])
-                        height = int(stream["height"])
-                    elif stream.get("codec_type") == "audio":
-                        has_audio = True
-                try:
-                    duration = float(info.get("format", {}).get("duration", 0) or 0)
-                except (TypeError, ValueError):
-                    duration = 0.0
-            specs.append({"path": path, "width": width, "height": height, "has_audio": has_audio})
-            durations.append(duration)
+        # Order is preserved; cached entries return without spawning ffprobe.
+        infos = list(self._probe_pool.map(self._probe_info, [Path(path) for path in files]))
+        for path, info in zip(files, infos):
+            if info is None:
+                specs.append({"path": path, "width": None, "height": None, "has_audio": False})
+                durations.append(0.0)
+                continue
+            specs.append({"path": path, "width": info.width, "height": info.height, "has_audio": info.has_audio})
+            durations.append(info.duration)
         return specs, durations
 
-    def _probe_info(self, media_path: Path) -> Dict[str, Any] | None:
+    def _probe_info(self, media_path: Path) -> MediaInfo | None:
         try:
-            return self.ffmpeg_service.probe(media_path)
+            return MediaInfo.from_probe(self.ffmpeg_service.probe(media_path))
         except Exception:  # noqa: BLE001
             return None
 
+    def _invalidate_probes(self, paths: List[str]) -> None:
+        for path in paths:
+            self.ffmpeg_service.invalidate_probe(path)
+
     def _build_params(self, settings: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
         video_cfg = settings["video"]
         audio_cfg = settings["audio"]
         advanced_cfg = settings["advanced"]
 
         video_params: Dict[str, Any] = {"crf": advanced_cfg["crf"]}
-        if video_cfg["codec"] != "自动":
+        if video_cfg["codec"] != _AUTO:
             video_params["codec"] = video_cfg["codec"]
         if video_cfg["bitrate"]:
             video_params["bitrate"] = video_cfg["bitrate"].strip()
-        if video_cfg["resolution"] != "自动":
+        if video_cfg["resolution"] != _AUTO:
             video_params["resolution"] = video_cfg["resolution"]
         if frame_rate := int(video_cfg["frame_rate"]):
             video_params["fps"] = frame_rate
@@ -281,21 +363,22 @@ class MainWindow(QMainWindow):
             video_params["preset"] = advanced_cfg["preset"]
         if advanced_cfg["tune"] != "auto":
             video_params["tune"] = advanced_cfg["tune"]
+        video_params["hwaccel"] = _HWACCEL_MAP.get(advanced_cfg["hardware"], "none")
 
         audio_params: Dict[str, Any] = {}
-        if audio_cfg["codec"] != "自动":
+        if audio_cfg["codec"] != _AUTO:
             audio_params["codec"] = audio_cfg["codec"]
         if audio_cfg["bitrate"]:
             audio_params["bitrate"] = audio_cfg["bitrate"].strip()
-        if audio_cfg["sample_rate"] != "自动":
+        if audio_cfg["sample_rate"] != _AUTO:
             audio_params["sample_rate"] = int(audio_cfg["sample_rate"])
-        if audio_cfg["channels"] != "自动":
-            mapping = {"单声道": 1, "立体声": 2, "5.1": 6}
-            audio_params["channels"] = mapping.get(audio_cfg["channels"], audio_cfg["channels"])
+        if audio_cfg["channels"] != _AUTO:
+            audio_params["channels"] = _CHANNEL_MAP.get(audio_cfg["channels"], audio_cfg["channels"])
 
         return {"video": video_params, "audio": audio_params}
 
-    def _resolve_output_path(self, input_path: Path, settings: Dict[str, Any]) -> Path:
+    def _resolve_output_path(self, input_path: Path, settings: Dict[str, Any], default_suffix: str = "") -> Path:
+        """未填写输出路径时，输出到输入文件旁（文件名追加 ``default_suffix``）。"""
         output_cfg = settings["output"]
         target = output_cfg["path"].strip()
         extension = output_cfg["format"]
@@ -304,56 +387,77 @@ class MainWindow(QMainWindow):
             if target_path.is_dir():
                 target_path = target_path / f"{input_path.stem}.{extension}"
         else:
-            target_path = input_path.with_suffix(f".{extension}")
-        target_path.parent.mkdir(parents=True, exist_ok=True)
+            target_path = input_path.with_name(f"{input_path.stem}{default_suffix}.{extension}")
+        # Batched jobs usually share one output directory; create it once per session.
+        if target_path.parent not in self._mkdir_done:
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            self._mkdir_done.add(target_path.parent)
         return target_path
 
     def _probe_duration(self, media_path: Path) -> float | None:
         info = self._probe_info(media_path)
-        if not info:
-            return None
-        try:
-            return float(info.get("format", {}).get("duration", 0)) or None
-        except (TypeError, ValueError):
+        if info is None:
             return None
+        return info.duration or None
 
     # ------------------------------------------------------------------
     # Progress callbacks
     # ------------------------------------------------------------------
-    def _progress_callback(self, update: ProgressUpdate) -> None:
-        percent = update.progress if update.progress is not None else self.current_progress
+    def _progress_callback(self, job: Job, update: ProgressUpdate) -> None:
         if update.progress is not None:
-            self.current_progress = update.progress
-        eta_text = f" 剩余 {int(update.eta)}s" if update.eta and update.eta > 0 else ""
-        message = f"处理进度 {self.current_progress * 100:4.1f}%{eta_text}"
-        if update.done and update.return_code == 0:
-            message = "任务完成"
-        self.signals.progressChanged.emit(self.current_progress, message)
+            job.progress = update.progress
+        # Runs on TaskManager threads; the bar shows the mean over all running jobs.
+        running = list(self.active_task_ids.values()) or [job]
+        overall = sum(item.progress for item in running) / len(running)
+        if len(running) > 1:
+            message = f"处理进度 {overall * 100:4.1f}%（{len(running)} 个任务）"
+        else:
+            eta_text = f" 剩余 {int(update.eta)}s" if update.eta and update.eta > 0 else ""
+            message = f"处理进度 {overall * 100:4.1f}%{eta_text}"
+            if update.done and update.return_code == 0:
+                message = "任务完成"
+
+        # At most ~20 updates per second reach the GUI thread, unless progress jumps.
+        now = time.monotonic()
+        if not update.done and now - self._last_emit_ts < 0.05 and abs(overall - self._last_emit_pct) < 0.01:
+            return
+        self._last_emit_ts = now
+        self._last_emit_pct = overall
+        self.progressChanged.emit(overall, message)
 
     def _handle_task_update(self, task: Task) -> None:
-        if task.task_id != self.active_task_id:
+        job = self.active_task_ids.get(task.task_id)
+        if job is None:
             return
         if task.status == TaskStatus.COMPLETED:
-            self.signals.taskCompleted.emit()
-            self._finish_job(success=True)
+            self._finish_job(job, success=True)
+            if not self._running_count() and not self.pending_jobs:
+                self.taskCompleted.emit()
         elif task.status == TaskStatus.FAILED:
-            self.signals.taskFailed.emit(task.error or "未知错误")
-            self._finish_job(success=False)
-
-    def _finish_job(self, success: bool) -> None:
-        self.active_task_id = None
-        self.file_panel.set_busy(False)
-        if success and self.current_job:
-            for path in self.current_job.files:
-                self.file_panel.remove_file(path)
+            self.taskFailed.emit(task.error or "未知错误")
+            self._finish_job(job, success=False)
+        elif task.status == TaskStatus.CANCELLED:
+            self.statusChanged.emit("任务已取消")
+            self._finish_job(job, success=False)
+
+    def _finish_job(self, job: Job, success: bool) -> None:
+        if job.task_id is not None:
+            self.active_task_ids.pop(job.task_id, None)
+        elif job in self.starting_jobs:
+            self.starting_jobs.remove(job)
+        if success:
+            self.file_panel.remove_files(job.files)
             self.preview_panel.stop_preview()
-        self.current_job = None
-        self.current_progress = 0.0
-        self.progress_bar.setValue(0)
+        if not self._running_count():
+            self.file_panel.set_busy(False)
+            self.progress_bar.setValue(0)
         self._start_next_job()
 
     def _apply_progress(self, percent: float, message: str) -> None:
-        self.progress_bar.setValue(int(max(0.0, min(1.0, percent)) * 100))
+        value = int(percent * 100)
+        value = 0 if value < 0 else 100 if value > 100 else value
+        if value != self.progress_bar.value():
+            self.progress_bar.setValue(value)
         self.status_message.setText(message)
 
     def _set_status_text(self, text: str) -> None:
@@ -369,7 +473,15 @@ class MainWindow(QMainWindow):
     # Qt events
     # ------------------------------------------------------------------
     def closeEvent(self, event) -> None:  # noqa: N802
+        # shutdown() reports cancelled tasks synchronously; without this each one would
+        # finish its job and start the next pending one against a closing manager.
+        self.pending_jobs.clear()
+        self.starting_jobs.clear()
+        self.taskUpdated.disconnect()
         self.task_manager.shutdown()
+        self._probe_pool.shutdown(wait=False, cancel_futures=True)
+        self.ffmpeg_service.save_probe_cache()
+        self.preview_panel.release_thumbnails()
         super().closeEvent(event)
 
 
@@ -1,15 +1,17 @@
 ﻿from __future__ import annotations
 
+import os
 import subprocess
 import tempfile
+from collections import OrderedDict
 from pathlib import Path
+from typing import Tuple
 
-from PyQt5.QtCore import QAbstractAnimation, QEasingCurve, QPropertyAnimation, QSize, Qt, QUrl
-from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtCore import QAbstractAnimation, QEasingCurve, QSize, Qt, QThreadPool, QUrl, QVariantAnimation
+from PyQt5.QtGui import QColor, QIcon, QPixmap
 from PyQt5.QtMultimedia import QMediaContent, QMediaPlayer
 from PyQt5.QtMultimediaWidgets import QVideoWidget
 from PyQt5.QtWidgets import (
-    QGraphicsOpacityEffect,
     QHBoxLayout,
     QLabel,
     QPushButton,
@@ -18,15 +20,50 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 
+from .workers import BackgroundWorker
+
+try:
+    import av
+except ImportError:  # PyAV is optional; thumbnails then fall back to the ffmpeg CLI.
+    av = None
+
 ICON_DIR = Path(__file__).resolve().parents[1] / "resources" / "icons"
 
+# (path, st_size, st_mtime_ns) of the media a thumbnail was extracted from.
+ThumbnailKey = Tuple[str, int, int]
+THUMBNAIL_CACHE_SIZE = 32
+
+_PLACEHOLDER_QSS = "border: 1px dashed {border}; padding: 40px; color: #7f88af; border-radius: 16px;"
+_BORDER_IDLE = QColor("#3a3f5a")
+_BORDER_GLOW = QColor("#1E66FF")
+# The pulse fades glow -> idle in a few discrete steps, each a precomputed stylesheet.
+_PULSE_STEPS = 8
+
+
+def _blend(start: QColor, end: QColor, t: float) -> QColor:
+    return QColor(
+        round(start.red() + (end.red() - start.red()) * t),
+        round(start.green() + (end.green() - start.green()) * t),
+        round(start.blue() + (end.blue() - start.blue()) * t),
+    )
+
+
+_PULSE_QSS = tuple(
+    _PLACEHOLDER_QSS.format(border=_blend(_BORDER_GLOW, _BORDER_IDLE, step / (_PULSE_STEPS - 1)).name())
+    for step in range(_PULSE_STEPS)
+)
+_IDLE_STEP = _PULSE_STEPS - 1
+
 
 class PreviewWindow(QWidget):
     """中央预览面板，支持播放和缩略图回退。"""
 
     def __init__(self, parent: QWidget | None = None) -> None:
         super().__init__(parent)
-        self._thumbnail_path: str | None = None
+        self._thumbnails: OrderedDict[ThumbnailKey, str] = OrderedDict()
+        self._pending_thumbnails: set[ThumbnailKey] = set()
+        # Path currently loaded into the player; reselecting it is a no-op.
+        self._current_path: str | None = None
         self._build_ui()
         self._setup_animation()
 
@@ -38,9 +75,8 @@ class PreviewWindow(QWidget):
         self.stack = QStackedWidget()
         self.placeholder = QLabel("预览窗口")
         self.placeholder.setAlignment(Qt.AlignCenter)
-        self.placeholder.setStyleSheet(
-            "border: 1px dashed #3a3f5a; padding: 40px; color: #7f88af; border-radius: 16px;"
-        )
+        self._border_step = -1
+        self._set_placeholder_step(_IDLE_STEP)
         self.stack.addWidget(self.placeholder)
 
         self.video_widget = QVideoWidget()
@@ -81,47 +117,99 @@ class PreviewWindow(QWidget):
         return button
 
     def _setup_animation(self) -> None:
-        effect = QGraphicsOpacityEffect(self.placeholder)
-        effect.setOpacity(1.0)
-        self.placeholder.setGraphicsEffect(effect)
-        self._glow_effect = effect
-
-        self._glow_anim = QPropertyAnimation(self._glow_effect, b"opacity", self)
+        # The animation only picks one of _PULSE_STEPS stylesheets and the label is
+        # restyled when the step changes, so a pulse costs a handful of repolishes rather
+        # than one per frame (or an offscreen pixmap per frame with an opacity effect).
+        self._glow_anim = QVariantAnimation(self)
         self._glow_anim.setDuration(900)
-        self._glow_anim.setStartValue(0.6)
-        self._glow_anim.setEndValue(1.0)
+        self._glow_anim.setStartValue(0)
+        self._glow_anim.setEndValue(_IDLE_STEP)
         self._glow_anim.setEasingCurve(QEasingCurve.Type.InOutSine)
         self._glow_anim.setLoopCount(2)
+        self._glow_anim.valueChanged.connect(self._set_placeholder_step)
+
+    def _set_placeholder_step(self, step: int) -> None:
+        if step == self._border_step:
+            return
+        self._border_step = step
+        self.placeholder.setStyleSheet(_PULSE_QSS[step])
 
     def load_media(self, path: str) -> None:
         if not path:
             self.stop_preview()
             return
+        if path == self._current_path:
+            # Rebuilding the media pipeline for the same file only restarts playback.
+            return
         media = QMediaContent(QUrl.fromLocalFile(path))
         self.player.setMedia(media)
+        self._current_path = path
         self.stack.setCurrentWidget(self.video_widget)
         self.player.play()
-        self._pulse_preview()
 
     def _pulse_preview(self) -> None:
+        # Only the placeholder has a border to pulse; a playing video hides it.
+        if self.stack.currentWidget() is not self.placeholder:
+            return
         if self._glow_anim.state() == QAbstractAnimation.Running:
             self._glow_anim.stop()
         self._glow_anim.start()
 
     def stop_preview(self) -> None:
         self.player.stop()
+        self._current_path = None
         self.stack.setCurrentWidget(self.placeholder)
-        self._glow_effect.setOpacity(1.0)
+        self._glow_anim.stop()
+        self._set_placeholder_step(_IDLE_STEP)
         self.placeholder.setPixmap(QPixmap())
         self.placeholder.setText("预览窗口")
-        if self._thumbnail_path:
-            Path(self._thumbnail_path).unlink(missing_ok=True)
-            self._thumbnail_path = None
+
+    def release_thumbnails(self) -> None:
+        """删除缓存的缩略图临时文件。"""
+        for thumb_path in self._thumbnails.values():
+            Path(thumb_path).unlink(missing_ok=True)
+        self._thumbnails.clear()
 
     def _handle_error(self, *_args) -> None:
         path = self.player.currentMedia().canonicalUrl().toLocalFile()
-        thumb = self._generate_thumbnail(path)
         self.stack.setCurrentWidget(self.placeholder)
+        key = self._thumbnail_key(path)
+        if key is None:
+            self._show_thumbnail(None)
+            return
+        cached = self._thumbnails.get(key)
+        if cached and Path(cached).exists():
+            self._thumbnails.move_to_end(key)
+            self._show_thumbnail(cached)
+            return
+        self.placeholder.setPixmap(QPixmap())
+        self.placeholder.setText("正在生成缩略图…")
+        if key in self._pending_thumbnails:
+            return
+        # ffmpeg runs in the pool; the result comes back through a queued signal.
+        self._pending_thumbnails.add(key)
+        worker = BackgroundWorker(self._generate_thumbnail, key)
+        worker.signals.finished.connect(self._on_thumbnail_ready)
+        worker.signals.failed.connect(self._on_thumbnail_failed)
+        QThreadPool.globalInstance().start(worker)
+
+    def _on_thumbnail_ready(self, result: Tuple[ThumbnailKey, str | None]) -> None:
+        key, thumb = result
+        self._pending_thumbnails.discard(key)
+        if thumb:
+            self._thumbnails[key] = thumb
+            while len(self._thumbnails) > THUMBNAIL_CACHE_SIZE:
+                _key, stale = self._thumbnails.popitem(last=False)
+                Path(stale).unlink(missing_ok=True)
+        # The user may have moved on to another file while ffmpeg was running.
+        if key[0] == self.player.currentMedia().canonicalUrl().toLocalFile():
+            self._show_thumbnail(thumb)
+
+    def _on_thumbnail_failed(self, args: Tuple[ThumbnailKey], _message: str) -> None:
+        # Unexpected errors must still clear the pending key, or the file never retries.
+        self._on_thumbnail_ready((args[0], None))
+
+    def _show_thumbnail(self, thumb: str | None) -> None:
         if thumb:
             self.placeholder.setPixmap(QPixmap(thumb))
             self.placeholder.setScaledContents(True)
@@ -129,6 +217,7 @@ class PreviewWindow(QWidget):
         else:
             self.placeholder.setPixmap(QPixmap())
             self.placeholder.setText("无法播放预览，格式不受支持")
+        self._pulse_preview()
 
     def _handle_status(self, status) -> None:
         if status == QMediaPlayer.EndOfMedia:
@@ -136,13 +225,27 @@ class PreviewWindow(QWidget):
         elif status == QMediaPlayer.InvalidMedia:
             self._handle_error()
 
-    def _generate_thumbnail(self, media_path: str) -> str | None:
+    @staticmethod
+    def _thumbnail_key(media_path: str) -> ThumbnailKey | None:
         if not media_path:
             return None
+        try:
+            st = os.stat(media_path)
+        except OSError:
+            return None
+        return media_path, st.st_size, st.st_mtime_ns
+
+    @staticmethod
+    def _generate_thumbnail(key: ThumbnailKey) -> Tuple[ThumbnailKey, str | None]:
+        """在工作线程中抽取一帧缩略图，不访问任何控件状态。"""
+        media_path = key[0]
+        tmp_path = None
         try:
             tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
             tmp_path = tmp.name
             tmp.close()
+            if av is not None and PreviewWindow._decode_thumbnail(media_path, tmp_path):
+                return key, tmp_path
             subprocess.run(
                 [
                     "ffmpeg",
@@ -159,7 +262,25 @@ class PreviewWindow(QWidget):
                 stderr=subprocess.DEVNULL,
                 check=True,
             )
-            self._thumbnail_path = tmp_path
-            return tmp_path
+            return key, tmp_path
         except (OSError, subprocess.CalledProcessError):
-            return None
+            if tmp_path:
+                Path(tmp_path).unlink(missing_ok=True)
+            return key, None
+
+    @staticmethod
+    def _decode_thumbnail(media_path: str, tmp_path: str) -> bool:
+        """用 PyAV 在进程内解码 1 秒处的一帧，省去启动 ffmpeg 进程的开销。"""
+        try:
+            with av.open(media_path) as container:
+                if not container.streams.video:
+                    return False
+                # Offset in AV_TIME_BASE units; lands on the keyframe before 1 s.
+                container.seek(1_000_000)
+                for frame in container.decode(video=0):
+                    # to_image() needs Pillow; any failure falls back to the CLI.
+                    frame.to_image().save(tmp_path, "JPEG")
+                    return True
+        except Exception:  # noqa: BLE001
+            pass
+        return False
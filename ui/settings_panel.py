@@ -1,8 +1,8 @@
 ﻿from __future__ import annotations
 
-from typing import Callable
+from typing import Callable, Dict
 
-from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtCore import QTimer, pyqtSignal
 from PyQt5.QtWidgets import (
     QComboBox,
     QFileDialog,
@@ -18,6 +18,50 @@ from PyQt5.QtWidgets import (
 )
 
 
+# What export_settings() reports for a tab whose widgets were never built; must match
+# the initial widget values set up in the _build_*_tab methods.
+_TAB_DEFAULTS = {
+    "audio": {"sample_rate": "自动", "channels": "自动", "bitrate": "", "codec": "自动"},
+    "advanced": {"crf": 23, "preset": "auto", "tune": "auto", "hardware": "自动"},
+    "output": {"format": "mp4", "path": ""},
+}
+
+
+class _LazyTabWidget(QTabWidget):
+    """Tab widget whose pages are built by a factory the first time they are shown."""
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self._factories: Dict[int, Callable[[], QWidget]] = {}
+        self.currentChanged.connect(self.ensure_built)
+
+    def add_lazy_tab(self, factory: Callable[[], QWidget], label: str) -> int:
+        index = self.addTab(QWidget(), label)
+        self._factories[index] = factory
+        return index
+
+    def is_built(self, index: int) -> bool:
+        return index not in self._factories
+
+    def ensure_built(self, index: int) -> None:
+        factory = self._factories.pop(index, None)
+        if factory is None:
+            return
+        current = self.currentIndex()
+        label = self.tabText(index)
+        page = factory()
+        # Swapping the placeholder would otherwise re-enter currentChanged.
+        blocked = self.blockSignals(True)
+        try:
+            placeholder = self.widget(index)
+            self.removeTab(index)
+            self.insertTab(index, page, label)
+            self.setCurrentIndex(current)
+        finally:
+            self.blockSignals(blocked)
+        placeholder.deleteLater()
+
+
 class SettingsPanel(QWidget):
     """Parameter configuration stack for video/audio/advanced/output."""
 
@@ -26,6 +70,14 @@ class SettingsPanel(QWidget):
     def __init__(self, on_change: Callable[[dict], None] | None = None, parent: QWidget | None = None) -> None:
         super().__init__(parent)
         self._on_change = on_change
+        # Bursts of widget changes (typing, spinning) settle into a single emit.
+        self._emit_timer = QTimer(self)
+        self._emit_timer.setSingleShot(True)
+        self._emit_timer.setInterval(50)
+        self._emit_timer.timeout.connect(self._do_emit_change)
+        # export_settings() result, rebuilt only after a widget changed.
+        self._settings_cache: dict = {}
+        self._settings_dirty = True
         self._build_ui()
 
     def _build_ui(self) -> None:
@@ -33,11 +85,12 @@ class SettingsPanel(QWidget):
         root.setContentsMargins(12, 12, 12, 12)
         root.setSpacing(10)
 
-        self.tabs = QTabWidget()
+        # Only the video tab is visible at startup; the others are built on first show.
+        self.tabs = _LazyTabWidget()
         self.tabs.addTab(self._build_video_tab(), "视频")
-        self.tabs.addTab(self._build_audio_tab(), "音频")
-        self.tabs.addTab(self._build_advanced_tab(), "高级")
-        self.tabs.addTab(self._build_output_tab(), "输出")
+        self._audio_tab = self.tabs.add_lazy_tab(self._build_audio_tab, "音频")
+        self._advanced_tab = self.tabs.add_lazy_tab(self._build_advanced_tab, "高级")
+        self._output_tab = self.tabs.add_lazy_tab(self._build_output_tab, "输出")
         root.addWidget(self.tabs)
 
         self.status_label = QLabel("等待参数配置…")
@@ -161,12 +214,23 @@ class SettingsPanel(QWidget):
     def _register_change(self, widget: QWidget) -> None:
         if hasattr(widget, "editingFinished"):
             widget.editingFinished.connect(self._emit_change)  # type: ignore[attr-defined]
+        if isinstance(widget, QLineEdit):
+            # Text can be read before editing finishes, so every edit invalidates the cache.
+            widget.textChanged.connect(self._mark_dirty)
         if hasattr(widget, "currentIndexChanged"):
+            widget.currentIndexChanged.connect(self._mark_dirty)  # type: ignore[attr-defined]
             widget.currentIndexChanged.connect(lambda _idx: self._emit_change())  # type: ignore[attr-defined]
         if isinstance(widget, QSpinBox):
+            widget.valueChanged.connect(self._mark_dirty)
             widget.valueChanged.connect(lambda _val: self._emit_change())
 
+    def _mark_dirty(self, *_args) -> None:
+        self._settings_dirty = True
+
     def _emit_change(self) -> None:
+        self._emit_timer.start()
+
+    def _do_emit_change(self) -> None:
         payload = self.export_settings()
         self.settingsChanged.emit(payload)
         if self._on_change:
@@ -176,31 +240,51 @@ class SettingsPanel(QWidget):
         self.status_label.setText(text)
 
     def set_output_path(self, path: str) -> None:
+        self.tabs.ensure_built(self._output_tab)
         self.output_path.setText(path)
         self._emit_change()
 
     def export_settings(self) -> dict:
-        return {
+        """Current parameters; the result is shared until a setting changes, so copy before mutating."""
+        if not self._settings_dirty:
+            return self._settings_cache
+        self._settings_cache = {
             "video": {
                 "resolution": self.resolution.currentText(),
                 "frame_rate": self.frame_rate.value(),
                 "bitrate": self.video_bitrate.text(),
                 "codec": self.video_codec.currentText(),
             },
-            "audio": {
-                "sample_rate": self.sample_rate.currentText(),
-                "channels": self.channels.currentText(),
-                "bitrate": self.audio_bitrate.text(),
-                "codec": self.audio_codec.currentText(),
-            },
-            "advanced": {
-                "crf": self.crf.value(),
-                "preset": self.preset.currentText(),
-                "tune": self.tune.currentText(),
-                "hardware": self.hardware.currentText(),
-            },
-            "output": {
-                "format": self.container.currentText(),
-                "path": self.output_path.text(),
-            },
+            "audio": self._export_section(self._audio_tab, "audio", self._export_audio),
+            "advanced": self._export_section(self._advanced_tab, "advanced", self._export_advanced),
+            "output": self._export_section(self._output_tab, "output", self._export_output),
+        }
+        self._settings_dirty = False
+        return self._settings_cache
+
+    def _export_section(self, index: int, name: str, exporter: Callable[[], dict]) -> dict:
+        if self.tabs.is_built(index):
+            return exporter()
+        return dict(_TAB_DEFAULTS[name])
+
+    def _export_audio(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate.currentText(),
+            "channels": self.channels.currentText(),
+            "bitrate": self.audio_bitrate.text(),
+            "codec": self.audio_codec.currentText(),
+        }
+
+    def _export_advanced(self) -> dict:
+        return {
+            "crf": self.crf.value(),
+            "preset": self.preset.currentText(),
+            "tune": self.tune.currentText(),
+            "hardware": self.hardware.currentText(),
+        }
+
+    def _export_output(self) -> dict:
+        return {
+            "format": self.container.currentText(),
+            "path": self.output_path.text(),
         }
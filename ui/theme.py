@@ -99,6 +99,13 @@ QProgressBar::chunk {
 """
 
 
+# Stored on the application so re-applying an unchanged theme skips Qt's QSS parse.
+_QSS_HASH = hash(THEME_QSS)
+
+
 def apply_theme(app: Any) -> None:
     """Apply global stylesheet to a QApplication instance."""
+    if app.property("themeHash") == _QSS_HASH:
+        return
     app.setStyleSheet(THEME_QSS)
+    app.setProperty("themeHash", _QSS_HASH)
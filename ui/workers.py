@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    """后台任务的结果信号；连接到 GUI 对象的槽时以排队方式回到主线程。"""
+
+    finished = pyqtSignal(object)
+    # (args, error message)
+    failed = pyqtSignal(object, str)
+
+
+class BackgroundWorker(QRunnable):
+    """在 QThreadPool 中执行 ``fn(*args)``，通过 ``signals`` 交付返回值。"""
+
+    def __init__(self, fn: Callable[..., Any], *args: Any) -> None:
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        # Created on the GUI thread so queued deliveries target its event loop.
+        self.signals = WorkerSignals()
+
+    def run(self) -> None:
+        try:
+            result = self.fn(*self.args)
+        except Exception as exc:  # noqa: BLE001
+            self.signals.failed.emit(self.args, str(exc))
+        else:
+            self.signals.finished.emit(result)